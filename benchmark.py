@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark for gene_plotter.py
+
+Makes synthetic genbank files of a given number of features (bacterial genomes with a few thousand features
+up to eukaryotic genomes with hundreds of thousands), and times the single steps separately:
+reading the file (completely, and only up to the genes of a plot), finding the start/stop coordinates,
+making the plot, and saving it in each output format.
+The results are written as json, so that they can be compared between versions.
+
+Run e.g. python3 benchmark.py --features 5000 50000 --output results.json
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+import gene_plotter
+
+lProducts = ["ABC transporter permease","hypothetical protein","transposase","ribosomal protein L3",
+             "flagellar motor switch protein","DNA polymerase III subunit alpha","phage tail protein",
+             "MFS transporter","histidine kinase ","membrane protein","tRNA-Ala","16S ribosomal RNA"]
+
+def get_location(iStart,iStop,i,cRandom):
+    '''a location of one feature between iStart and iStop. The kind depends on i, so that every file has
+    the same mixture: simple, complement, join, order, complement(join) and long joins with many exons
+    '''
+
+    iKind = i%10
+    if iKind<5:
+        return str(iStart)+".."+str(iStop)
+    if iKind==5:
+        return "complement("+str(iStart)+".."+str(iStop)+")"
+    if iKind==6:
+        iExons = cRandom.randint(2,3)
+    elif iKind==7 or iKind==8:
+        iExons = cRandom.randint(3,6)
+    else:
+        iExons = cRandom.randint(8,12)
+    #exon borders: sorted, different positions within the feature
+    lBorders = sorted(cRandom.sample(range(iStart+1,iStop),2*iExons-2))
+    lBorders = [iStart]+lBorders+[iStop]
+    sExons = ",".join(str(lBorders[j])+".."+str(lBorders[j+1]) for j in range(0,len(lBorders),2))
+    if iKind==7:
+        return "complement(join("+sExons+"))"
+    if iKind==8:
+        return "order("+sExons+")"
+    return "join("+sExons+")"
+
+def wrap_location(sType,sLocation):
+    '''the location lines of a feature as in genbank files, long locations go over several lines.
+    The first line always keeps at least two exons
+    '''
+
+    lParts = sLocation.split(",")
+    lLines = []
+    sLine = ""
+    for j,sPart in enumerate(lParts):
+        if j<len(lParts)-1:
+            sPart = sPart+","
+        if sLine and len(sLine)+len(sPart)>58 and (lLines or sLine.count("..")>=2):
+            lLines.append(sLine)
+            sLine = ""
+        sLine = sLine+sPart
+    lLines.append(sLine)
+    lOut = ["     "+sType.ljust(16)+lLines[0]]
+    for sLine in lLines[1:]:
+        lOut.append(" "*21+sLine)
+    return lOut
+
+def write_record(outputFile,sContig,iFeatures,iOffset,cRandom,bSequence):
+    '''writes one LOCUS record with iFeatures features (each a gene and a CDS, tRNA or rRNA)
+    '''
+
+    lFeatures = []
+    iPos = 100
+    for i in range(iFeatures):
+        iLength = cRandom.randint(300,3000)
+        sType = "CDS"
+        if i%29==0:
+            sType = "tRNA"
+            iLength = cRandom.randint(70,95)
+        elif i%97==0:
+            sType = "rRNA"
+        lFeatures.append((sType,iPos,iPos+iLength))
+        iPos = iPos+iLength+cRandom.randint(10,300)
+    iLength = iPos+100
+    outputFile.write("LOCUS       "+sContig+"  "+str(iLength)+" bp    DNA     linear   BCT 01-JAN-2020\n")
+    outputFile.write("DEFINITION  synthetic benchmark genome "+sContig+".\n")
+    outputFile.write("FEATURES             Location/Qualifiers\n")
+    outputFile.write("     source          1.."+str(iLength)+"\n")
+    outputFile.write('                     /organism="Benchmarkia synthetica"\n')
+    outputFile.write('                     /strain="B1"\n')
+    for i,(sType,iStart,iStop) in enumerate(lFeatures):
+        if sType=="CDS":
+            sLocation = get_location(iStart,iStop,i,cRandom)
+        else:
+            sLocation = get_location(iStart,iStop,i%6,cRandom)
+        sLocus = sContig+"_"+str(iOffset+i).zfill(7)
+        lQualifiers = ['/locus_tag="'+sLocus+'"']
+        if i%5==0:
+            lQualifiers.append('/gene="gen'+str(iOffset+i)+'"')
+        #the gene spans the whole feature
+        sGeneLocation = str(iStart)+".."+str(iStop)
+        if sLocation.startswith("complement"):
+            sGeneLocation = "complement("+sGeneLocation+")"
+        outputFile.write("\n".join(wrap_location("gene",sGeneLocation))+"\n")
+        for sQualifier in lQualifiers:
+            outputFile.write(" "*21+sQualifier+"\n")
+        outputFile.write("\n".join(wrap_location(sType,sLocation))+"\n")
+        lQualifiers.append('/old_locus_tag="OLD_'+sLocus+'"')
+        lQualifiers.append('/product="'+lProducts[i%len(lProducts)]+'"')
+        if sType=="CDS":
+            lQualifiers.append('/protein_id="XP_'+str(iOffset+i).zfill(9)+'.1"')
+        for sQualifier in lQualifiers:
+            outputFile.write(" "*21+sQualifier+"\n")
+    outputFile.write("ORIGIN\n")
+    if bSequence:
+        aBases = np.frombuffer(b"acgt",dtype=np.uint8)
+        for j in range(1,iLength+1,60):
+            bLine = aBases[np.random.randint(0,4,min(60,iLength-j+1))].tobytes().decode()
+            outputFile.write(str(j).rjust(9)+" "+" ".join(bLine[k:k+10] for k in range(0,len(bLine),10))+"\n")
+    outputFile.write("//\n")
+
+def make_genbank(sFile,iFeatures,iRecords=1,bSequence=False,iSeed=1):
+    '''writes a synthetic genbank file with iFeatures features, divided over iRecords records.
+    Returns the locus tags of each record, so that the benchmark can pick start and stop genes
+    '''
+
+    cRandom = random.Random(iSeed)
+    np.random.seed(iSeed)
+    lRecords = []
+    iOffset = 0
+    with open(sFile,"w") as outputFile:
+        for i in range(iRecords):
+            iCount = iFeatures//iRecords+(1 if i<iFeatures%iRecords else 0)
+            sContig = "CONTIG"+str(i+1)
+            write_record(outputFile,sContig,iCount,iOffset,cRandom,bSequence)
+            lRecords.append((sContig,iOffset,iCount))
+            iOffset += iCount
+    return lRecords
+
+def get_time(function,iRepeat):
+    '''runs function iRepeat times, and returns the fastest time in seconds and the last result
+    '''
+
+    lTimes = []
+    result = None
+    for i in range(iRepeat):
+        fStart = time.perf_counter()
+        result = function()
+        lTimes.append(time.perf_counter()-fStart)
+    return min(lTimes),result
+
+def check_partial_read(sFile,lRecords,iWindow,sEntryType):
+    '''reading only up to some genes near the start of the first record should parse far fewer entries than reading the
+    whole file (at most half of the record), and give the same window as the full read. Returns the numbers and if this holds
+    '''
+
+    sContig,iOffset,iCount = lRecords[0]
+    iFirst = iOffset+min(100,iCount//10)
+    iLast = min(iOffset+iCount-1,iFirst+iWindow-1)
+    sStartGene = sContig+"_"+str(iFirst).zfill(7)
+    sStopGene = sContig+"_"+str(iLast).zfill(7)
+    with contextlib.redirect_stdout(io.StringIO()):
+        cFull = gene_plotter.read_genbank(sFile)
+        cPartial = gene_plotter.read_genbank(sFile,set([sStartGene,sStopGene]),sEntryType)
+    lWindows = []
+    for cGenome in (cFull,cPartial):
+        cTable = cGenome.get_table(sContig)
+        iStartCoord,iStopCoord = gene_plotter.get_start_stop_coords(cTable,sStartGene,sStopGene,sEntryType,gene_plotter.build_index(cTable,sEntryType))
+        cWindow = gene_plotter.get_window(cTable,iStartCoord,iStopCoord,gene_plotter.interval_index(cTable,sEntryType))
+        lWindows.append([cWindow.get(i).__dict__ for i in range(len(cWindow))])
+    dicCheck = {"start_gene":sStartGene,"stop_gene":sStopGene,"entries":len(cPartial.get_table(sContig)),
+                "record_entries":len(cFull.get_table(sContig)),"same_window":lWindows[0]==lWindows[1]}
+    dicCheck["ok"] = dicCheck["same_window"] and dicCheck["entries"]*2<=dicCheck["record_entries"]
+    return dicCheck
+
+def run_benchmark(sFile,lRecords,lFormats,iWindow,iRepeat,sEntryType):
+    '''times all steps for one genbank file. The plotted range are iWindow features in the middle of the last record
+    '''
+
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    sContig,iOffset,iCount = lRecords[-1]
+    iFirst = iOffset+max(0,iCount//2-iWindow//2)
+    iLast = min(iOffset+iCount-1,iFirst+iWindow-1)
+    sStartGene = sContig+"_"+str(iFirst).zfill(7)
+    sStopGene = sContig+"_"+str(iLast).zfill(7)
+    dicResult = {"file_size":os.path.getsize(sFile),"start_gene":sStartGene,"stop_gene":sStopGene,"timings":dict()}
+    dicTimes = dicResult["timings"]
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        dicTimes["read_genbank"],cGenome = get_time(lambda: gene_plotter.read_genbank(sFile),iRepeat)
+        dicTimes["read_genbank_genes"],cPartial = get_time(lambda: gene_plotter.read_genbank(sFile,set([sStartGene,sStopGene]),sEntryType),iRepeat)
+    dicResult["entries"] = sum(len(cTable) for cTable in cGenome.dicContigs.values())
+    dicResult["partial_read"] = check_partial_read(sFile,lRecords,iWindow,sEntryType)
+    dicResult["records"] = len(cGenome.dicContigs)
+
+    #the index is built with the first search, after that it is only a lookup
+    cTable = cGenome.get_table(sContig)
+    dicTimes["build_index"],dicIndex = get_time(lambda: gene_plotter.build_index(cTable,sEntryType),iRepeat)
+    dicTimes["get_start_stop_coords"],tCoords = get_time(lambda: gene_plotter.get_start_stop_coords(cTable,sStartGene,sStopGene,sEntryType,dicIndex),iRepeat)
+    iStartCoord,iStopCoord = tCoords
+    dicTimes["build_interval_index"],cIntervals = get_time(lambda: gene_plotter.interval_index(cTable,sEntryType),iRepeat)
+    dicTimes["get_window"],cWindow = get_time(lambda: gene_plotter.get_window(cTable,iStartCoord,iStopCoord,cIntervals),iRepeat)
+    dicResult["plotted_entries"] = len(cWindow)
+    cColours = gene_plotter.colour_rules(gene_plotter.DEFAULT_COLOUR_RULES)
+
+    def plot(sLabelLayout="fixed"):
+        iScale = iStopCoord-iStartCoord
+        fig = plt.figure(figsize=(0.00320*iScale,0.00320*iScale/6))
+        plt.subplots_adjust(wspace=0, hspace=0)
+        ax = fig.add_subplot(1,1,1)
+        gene_plotter.make_plot(cWindow,"forward",iScale,"gene_name","Up",0,sEntryType,sStartGene,sStopGene,"",".png",iStartCoord,iStopCoord,0,18,dict(),cGenome.sName,ax,True,1,cColours,sLabelLayout)
+        return fig
+    #the first plot also loads fonts etc., this is not counted
+    plt.close(plot())
+    dicTimes["make_plot_label_layout_auto"],fig = get_time(lambda: plt.close() or plot("auto"),iRepeat)
+    plt.close(fig)
+    dicTimes["make_plot"],fig = get_time(lambda: plt.close() or plot(),iRepeat)
+    for sExt in lFormats:
+        def save():
+            cBuffer = io.BytesIO()
+            fig.savefig(cBuffer,format=sExt)
+            return cBuffer.tell()
+        dicTimes["savefig_"+sExt],iSize = get_time(save,iRepeat)
+        dicResult["size_"+sExt] = iSize
+    plt.close("all")
+    return dicResult
+
+def get_parser():
+    parser = argparse.ArgumentParser(description="Times reading and plotting of synthetic genbank files of different sizes")
+    parser.add_argument("--features", type=int, nargs='+', default=[5000,50000,500000],help="Number of features of the synthetic genbank files, one benchmark per number. Default 5000 50000 500000")
+    parser.add_argument("--records", type=int, default=1,help="Number of LOCUS records the features are divided over. Default 1")
+    parser.add_argument("--sequence", action='store_true',help="Also write the sequence after ORIGIN, this makes the files much bigger")
+    parser.add_argument('--formats', nargs='+', default=["png","svg","pdf"],choices=['svg', 'png', 'pdf','jpg','ps','eps'],help="Formats for which saving is timed. Default png svg pdf")
+    parser.add_argument("--window", type=int, default=30,help="Number of features in the plotted range. Default 30")
+    parser.add_argument("--repeat", type=int, default=3,help="Each step is repeated this often, the fastest time is reported. Default 3")
+    parser.add_argument('--entry_type', nargs='+', default=["CDS","rRNA","tRNA"],help="Entry types used for finding the genes and plotting. Default: CDS rRNA tRNA")
+    parser.add_argument("--directory", type=str,help="Directory for the synthetic genbank files, they are kept there. Default: a temporary directory which is removed afterwards")
+    parser.add_argument("--output", type=str,help="json file for the results. Default: stdout")
+    return parser
+
+if __name__ == "__main__":
+    args = get_parser().parse_args()
+
+    sDir = args.directory or tempfile.mkdtemp(prefix="gene_plotter_benchmark_")
+    os.makedirs(sDir,exist_ok=True)
+    import matplotlib
+    dicOut = {"gene_plotter_version":gene_plotter.VERSION,"python":platform.python_version(),"numpy":np.__version__,
+              "matplotlib":matplotlib.__version__,"platform":platform.platform(),"repeat":args.repeat,"window":args.window,"results":[]}
+    try:
+        for iFeatures in args.features:
+            sFile = os.path.join(sDir,"synthetic_"+str(iFeatures)+"_"+str(args.records)+".gb")
+            sys.stderr.write("writing "+sFile+"\n")
+            fStart = time.perf_counter()
+            lRecords = make_genbank(sFile,iFeatures,args.records,args.sequence)
+            sys.stderr.write("benchmarking "+str(iFeatures)+" features (file written in "+str(round(time.perf_counter()-fStart,1))+" s)\n")
+            dicResult = {"features":iFeatures,"records_requested":args.records}
+            dicResult.update(run_benchmark(sFile,lRecords,args.formats,args.window,args.repeat,args.entry_type))
+            dicOut["results"].append(dicResult)
+            sys.stderr.write("  "+", ".join(sKey+": "+str(round(fTime,4))+" s" for sKey,fTime in dicResult["timings"].items())+"\n")
+    finally:
+        if not args.directory:
+            shutil.rmtree(sDir,ignore_errors=True)
+    if args.output:
+        with open(args.output,"w") as outputFile:
+            json.dump(dicOut,outputFile,indent=1)
+            outputFile.write("\n")
+    else:
+        json.dump(dicOut,sys.stdout,indent=1)
+        sys.stdout.write("\n")
+    lFailed = [dicResult for dicResult in dicOut["results"] if not dicResult["partial_read"]["ok"]]
+    for dicResult in lFailed:
+        sys.stderr.write("partial read check failed for "+str(dicResult["features"])+" features: "+json.dumps(dicResult["partial_read"])+"\n")
+    if lFailed:
+        sys.exit(1)
@@ -11,15 +11,83 @@ This script takes one or multiple genbank file, and makes a basic plot with pre-
 genes out of it.
 """
 
-import matplotlib.pyplot as plt
-import matplotlib.patches as mpatches
+#matplotlib is only imported where something is drawn, it takes most of the start up time
+import numpy as np
 import argparse
+import array
+import bisect
+import collections
+import contextlib
+import hashlib
+import io
+import json
+import mmap
+import multiprocessing
 import os
 import re
+import shlex
+import sys
+import time
 
 VERSION = "0.9"
+CACHE_VERSION = 6 #increase if the content of the cache files changes, old cache files will then be ignored
+GFF_BIN = 16384 #bp per bin of the coordinate index of GFF3 files
+#GFF3 types which are not plotted: the whole sequence, and parts of features. Exons and CDS parts are put together, see iter_gff
+lGffWhole = ["region","chromosome","contig","supercontig","scaffold"]
+lGffParts = ["five_prime_UTR","three_prime_UTR","start_codon","stop_codon","intron"]
 
+fInchPerBp = 0.00320 #empirical, tested... well, guessed, the height is derived from it as well. Just seems to scale fine 
 _rgbstring = re.compile(r'#[a-fA-F0-9]{6}$') #regex hex colours; check later in the file
+_dicBgzf = dict() #block and record index of bgzip files, see get_bgzf
+_dicGffIndex = dict() #coordinate and identifier index of GFF3 files, see get_gff_index
+_dicCharWidths = dict() #width of each character per font size, see get_char_widths
+_dicBatchCache = {"genomes":None,"dicts":dict(),"colours":dict()} #parsed genbank files (a genome_lru, made by the first job), colour/name files and colour schemes, shared by all batch jobs of a process
+#the default colouring scheme, see colour_rules. The first rule which fits wins
+DEFAULT_COLOUR_RULES = [("type=tRNA","#FF00FF"),("type=rRNA","#FF00FF"),
+                        ("transpos","red"),("phage","red"),("integras","red"),
+                        ("flagel","#800000"),
+                        ("transport","#008000"),("abc ","#008000"),("pts ","#008000"),("mfs","#008000"),("membrane","#008000"), # green
+                        ("ase ","blue"),
+                        ("ribosom","#00FF00")] # lime
+
+class PlotError(Exception):
+    '''raised for problems with the input, e.g. genes which can't be found.
+    The message is meant for the user, a single run exits with it, a batch only marks the job as failed
+    '''
+    pass
+
+class phase_timer:
+    '''collects how long each step of a plot takes (read_genbank, get_start_stop_coords, do_reverse, make_plot, savefig),
+    in total and per genbank file, and a few numbers like the number of features. Written out with --profile
+    '''
+    def __init__(self):
+        self.fStart = time.perf_counter()
+        self.dicTotal = dict()
+        self.dicFiles = dict()
+        self.lRows = []
+
+    @contextlib.contextmanager
+    def phase(self,sPhase,sFile=None):
+        fStart = time.perf_counter()
+        try:
+            yield
+        finally:
+            fTime = time.perf_counter()-fStart
+            self.dicTotal[sPhase] = self.dicTotal.get(sPhase,0)+fTime
+            if sFile:
+                dicFile = self.dicFiles.setdefault(sFile,dict())
+                dicFile[sPhase] = dicFile.get(sPhase,0)+fTime
+
+    def get_report(self):
+        dicReport = {"version":VERSION,"total":time.perf_counter()-self.fStart,"phases":self.dicTotal,"files":self.dicFiles,"rows":self.lRows,"peak_memory_mb":None}
+        try:
+            import resource
+            #kilobytes on linux, bytes on mac
+            iPeak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            dicReport["peak_memory_mb"] = iPeak/(1024*1024 if sys.platform=="darwin" else 1024)
+        except ImportError:
+            pass #not available on windows
+        return dicReport
 
 class entry:
     def __init__(self,sType,sStart,sStop,bComp=False):
@@ -32,40 +100,402 @@ class entry:
         self.sOldLocus = ""
         self.sProtein = ""
         self.bCompl = bComp
-        self.sColour = "grey"
         self.lExons = []
         self.lIntrons = []
 
+class string_pool:
+    '''all strings (identifiers, products, colours) of a genome, every string is kept only once and is referred to by
+    its position. While reading they are in a list, afterwards pack() puts them into one bytes object with an
+    offset array, which is much smaller than one python string per identifier
+    '''
+    def __init__(self,lStrings=None):
+        self.lStrings = lStrings or [""]
+        self.dicStrings = dict((sString,i) for i,sString in enumerate(self.lStrings))
+        self.bPacked = None
+        self.aOffset = None
 
-def get_colour(newEntry,dicColor):
-    """"very simple colouring scheme. Can be manually overriden by a given file with hex colours
-    No error handling for wrong colours in the file
-    """
+    def __len__(self):
+        if self.lStrings is None:
+            return len(self.aOffset)-1
+        return len(self.lStrings)
+
+    def __getitem__(self,i):
+        if self.lStrings is None:
+            return self.bPacked[self.aOffset[i]:self.aOffset[i+1]].decode("utf-8")
+        return self.lStrings[i]
+
+    def code(self,sString):
+        if self.lStrings is None:
+            self.unpack()
+        i = self.dicStrings.get(sString)
+        if i is None:
+            i = len(self.lStrings)
+            self.lStrings.append(sString)
+            self.dicStrings[sString] = i
+        return i
+
+    def pack(self):
+        if self.lStrings is None:return
+        lEncoded = [sString.encode("utf-8") for sString in self.lStrings]
+        self.aOffset = np.zeros(len(lEncoded)+1,dtype=np.int64)
+        np.cumsum([len(bString) for bString in lEncoded],out=self.aOffset[1:])
+        self.bPacked = b"".join(lEncoded)
+        self.lStrings = None
+        self.dicStrings = None
+
+    def unpack(self):
+        self.lStrings = [self[i] for i in range(len(self))]
+        self.dicStrings = dict((sString,i) for i,sString in enumerate(self.lStrings))
+        self.bPacked = None
+        self.aOffset = None
+
+class feature_table:
+    '''the entries of one contig, stored column wise instead of one entry object per feature, which takes a lot
+    of memory for big eukaryotic genomes. Start, stop, strand and type are arrays. Identifiers are stored
+    as positions in a string_pool, which is shared by all contigs of a genome.
+    The exons of all entries are in one flat array, the exons of entry i are aExons[aExonOffset[i]:aExonOffset[i+1]].
+    Introns are not stored, they are the gaps between the exons.
+    While reading, append() fills array.array columns, finish() turns them into numpy arrays.
+    Entry objects are only made for the entries which are plotted, see get()
+    '''
+    lIdColumns = ["sProduct","sGeneName","sLocus","sOldLocus","sProtein"]
+
+    def __init__(self,cStrings):
+        self.cStrings = cStrings
+        self.lTypes = []
+        self.aStart = array.array("q")
+        self.aStop = array.array("q")
+        self.aCompl = array.array("b")
+        self.aType = array.array("h")
+        self.dicIds = dict((sCol,array.array("i")) for sCol in self.lIdColumns)
+        self.aExonOffset = array.array("q",[0])
+        self.aExons = array.array("q")
+
+    def __len__(self):
+        return len(self.aStart)
+
+    def append(self,cNewEntry):
+        if not cNewEntry.sType in self.lTypes:
+            self.lTypes.append(cNewEntry.sType)
+        self.aType.append(self.lTypes.index(cNewEntry.sType))
+        self.aStart.append(cNewEntry.iStart)
+        self.aStop.append(cNewEntry.iStop)
+        self.aCompl.append(cNewEntry.bCompl)
+        for sCol in self.lIdColumns:
+            self.dicIds[sCol].append(self.cStrings.code(getattr(cNewEntry,sCol)))
+        for exons in cNewEntry.lExons:
+            self.aExons.extend(exons)
+        self.aExonOffset.append(len(self.aExons)//2)
+
+    def finish(self):
+        self.aStart = np.array(self.aStart,dtype=np.int64)
+        self.aStop = np.array(self.aStop,dtype=np.int64)
+        self.aCompl = np.array(self.aCompl,dtype=bool)
+        self.aType = np.array(self.aType,dtype=np.int16)
+        for sCol in self.lIdColumns:
+            self.dicIds[sCol] = np.array(self.dicIds[sCol],dtype=np.int32)
+        self.aExonOffset = np.array(self.aExonOffset,dtype=np.int64)
+        self.aExons = np.array(self.aExons,dtype=np.int64).reshape(-1,2)
+
+    def take(self,aRows):
+        '''returns a new feature table with only the given rows (a numpy array of positions), including their exons.
+        The table itself is not changed
+        '''
+        cTable = feature_table(self.cStrings)
+        cTable.lTypes = self.lTypes
+        cTable.aStart = self.aStart[aRows]
+        cTable.aStop = self.aStop[aRows]
+        cTable.aCompl = self.aCompl[aRows]
+        cTable.aType = self.aType[aRows]
+        for sCol in self.lIdColumns:
+            cTable.dicIds[sCol] = self.dicIds[sCol][aRows]
+        aCounts = self.aExonOffset[aRows+1]-self.aExonOffset[aRows]
+        cTable.aExonOffset = np.zeros(len(aRows)+1,dtype=np.int64)
+        np.cumsum(aCounts,out=cTable.aExonOffset[1:])
+        #position of each exon in the old table: old offset of its entry + position within the entry
+        aExonRows = np.repeat(self.aExonOffset[aRows]-cTable.aExonOffset[:-1],aCounts)+np.arange(cTable.aExonOffset[-1])
+        cTable.aExons = self.aExons[aExonRows].reshape(-1,2)
+        return cTable
+
+    def get_introns(self):
+        '''all introns of the table as array of [start,stop], these are the gaps between consecutive exons of an entry
+        '''
+        aEntryOfExon = np.repeat(np.arange(len(self)),np.diff(self.aExonOffset))
+        aSame = aEntryOfExon[:-1]==aEntryOfExon[1:]
+        return np.stack([self.aExons[:-1,1][aSame],self.aExons[1:,0][aSame]],axis=1)
+
+    def type_mask(self,sEntryType):
+        '''True for all entries of the wanted types
+        '''
+        if not sEntryType:
+            return np.ones(len(self),dtype=bool)
+        return np.isin(self.aType,[i for i,sType in enumerate(self.lTypes) if sType in sEntryType])
+
+    def get(self,i):
+        '''makes an entry object for entry i
+        '''
+        cEntry = entry(self.lTypes[self.aType[i]],self.aStart[i],self.aStop[i],bool(self.aCompl[i]))
+        for sCol in self.lIdColumns:
+            setattr(cEntry,sCol,self.cStrings[self.dicIds[sCol][i]])
+        cEntry.lExons = self.aExons[self.aExonOffset[i]:self.aExonOffset[i+1]].tolist()
+        for j in range(len(cEntry.lExons)-1):
+            cEntry.lIntrons.append([cEntry.lExons[j][1],cEntry.lExons[j+1][0]])
+        return cEntry
+
+class interval_index:
+    '''coordinate index of the entries (of the wanted types) of one feature table: the entries sorted by their left end,
+    and the running maximum of their right ends in this order. The entries which overlap a range are then found with two
+    binary searches, in O(log n + k), also if entries overlap each other or are not sorted in the file.
+    k also counts the entries in between which end before the range, only very long entries lead to many of them
+    '''
+    def __init__(self,cTable,sEntryType):
+        aRows = np.flatnonzero(cTable.type_mask(sEntryType))
+        aLeft = np.minimum(cTable.aStart[aRows],cTable.aStop[aRows])
+        aOrder = np.argsort(aLeft,kind="stable")
+        self.aRows = aRows[aOrder]
+        self.aLeft = aLeft[aOrder]
+        self.aRight = np.maximum(cTable.aStart[self.aRows],cTable.aStop[self.aRows])
+        self.aMaxRight = np.maximum.accumulate(self.aRight) if len(self.aRows) else self.aRight
+
+    def __len__(self):
+        return len(self.aRows)
+
+    def overlap(self,iStart,iStop):
+        '''positions in the feature table of all entries which overlap iStart to iStop (both included), sorted by their left end
+        '''
+        iFirst = np.searchsorted(self.aMaxRight,iStart,side="left")
+        iLast = np.searchsorted(self.aLeft,iStop,side="right")
+        if iFirst>=iLast:
+            return np.zeros(0,dtype=np.int64)
+        return self.aRows[iFirst:iLast][self.aRight[iFirst:iLast]>=iStart]
+
+    def inside(self,iStart,iStop):
+        '''like overlap, but only the entries which are completely within iStart to iStop
+        '''
+        iFirst = np.searchsorted(self.aLeft,iStart,side="left")
+        iLast = np.searchsorted(self.aLeft,iStop,side="right")
+        return self.aRows[iFirst:iLast][self.aRight[iFirst:iLast]<=iStop]
+
+    def get_extent(self,iStart,iStop):
+        '''the range, extended so that all entries which overlap it are completely within
+        '''
+        iFirst = np.searchsorted(self.aMaxRight,iStart,side="left")
+        iLast = np.searchsorted(self.aLeft,iStop,side="right")
+        aWanted = self.aRight[iFirst:iLast]>=iStart
+        if not aWanted.any():
+            return iStart,iStop
+        return min(iStart,int(self.aLeft[iFirst:iLast][aWanted].min())),max(iStop,int(self.aRight[iFirst:iLast][aWanted].max()))
+
+class genome:
+    '''a parsed genbank file. The entries of each record (contig) are kept apart in a feature_table, in the order of the file,
+    since a range over two contigs does not make any sense
+    '''
+    def __init__(self,sName=""):
+        self.sName = sName
+        self.cStrings = string_pool()
+        self.dicContigs = dict()
+        self.dicLength = dict() #length of each contig from the LOCUS line
+        self.dicIndex = dict()
+        self.dicIntervals = dict()
+        self.setGenes = None #if the file was only read up to some genes, these are the genes; None means it was read completely
+        self.lEntryType = None
+
+    def add(self,sContig,cNewEntry):
+        if not sContig in self.dicContigs:
+            self.dicContigs[sContig] = feature_table(self.cStrings)
+        self.dicContigs[sContig].append(cNewEntry)
+
+    def finish(self):
+        '''called after reading, nothing can be added afterwards
+        '''
+        for cTable in self.dicContigs.values():
+            cTable.finish()
+        self.cStrings.pack()
+
+    def get_state(self):
+        '''the content as plain lists/arrays, for storing it in the cache
+        '''
+        lContigs = []
+        for sContig,cTable in self.dicContigs.items():
+            dicState = dict((sKey,value) for sKey,value in vars(cTable).items() if sKey!="cStrings")
+            lContigs.append((sContig,dicState))
+        self.cStrings.pack()
+        return {"name":self.sName,"strings":(self.cStrings.bPacked,self.cStrings.aOffset),"contigs":lContigs,"lengths":self.dicLength}
+
+    def set_state(self,dicState):
+        '''the reverse of get_state
+        '''
+        self.sName = dicState["name"]
+        self.dicLength = dicState["lengths"]
+        self.cStrings = string_pool()
+        self.cStrings.lStrings = None
+        self.cStrings.bPacked,self.cStrings.aOffset = dicState["strings"]
+        for sContig,dicTable in dicState["contigs"]:
+            cTable = feature_table(self.cStrings)
+            vars(cTable).update(dicTable)
+            self.dicContigs[sContig] = cTable
+
+    def get_table(self,sContig):
+        if not sContig in self.dicContigs:
+            cTable = feature_table(self.cStrings)
+            cTable.finish()
+            return cTable
+        return self.dicContigs[sContig]
+
+    def get_index(self,sContig,sEntryType):
+        '''returns the identifier index of a contig, it is only built once
+        '''
+        tKey = (sContig,tuple(sEntryType or []))
+        if not tKey in self.dicIndex:
+            self.dicIndex[tKey] = build_index(self.get_table(sContig),sEntryType)
+        return self.dicIndex[tKey]
+
+    def get_intervals(self,sContig,sEntryType):
+        '''returns the interval_index of a contig, it is only built once
+        '''
+        tKey = (sContig,tuple(sEntryType or []))
+        if not tKey in self.dicIntervals:
+            self.dicIntervals[tKey] = interval_index(self.get_table(sContig),sEntryType)
+        return self.dicIntervals[tKey]
+
+    def has_contig(self,sContig):
+        return sContig in self.dicContigs or sContig in self.dicLength
+
+    def find_contig(self,sStartGene,sStopGene,sEntryType):
+        '''returns the first contig which has both start and stop gene.
+        If they are only found on different contigs, a PlotError is raised.
+        If a gene can't be found at all, get_start_stop_coords will complain about it later
+        '''
+        sStartContig = None
+        sStopContig = None
+        for sContig in self.dicContigs:
+            dicIndex = self.get_index(sContig,sEntryType)
+            if sStartGene in dicIndex and sStopGene in dicIndex:
+                return sContig
+            if sStartGene in dicIndex and sStartContig is None:
+                sStartContig = sContig
+            if sStopGene in dicIndex and sStopContig is None:
+                sStopContig = sContig
+        if not sStartContig is None and not sStopContig is None:
+            raise PlotError(sStartGene+" and "+sStopGene+" are on different contigs ("+sStartContig+", "+sStopContig+"), they can't be plotted as one range")
+        if not sStartContig is None:
+            return sStartContig
+        return next(iter(self.dicContigs),"")
+
+    def get_length(self,sContig):
+        '''length of a contig. If the LOCUS line does not have it, the end of the last entry
+        '''
+        if self.dicLength.get(sContig):
+            return self.dicLength[sContig]
+        cTable = self.get_table(sContig)
+        return int(max(cTable.aStart.max(),cTable.aStop.max())) if len(cTable) else 0
+
+    def count_features(self):
+        return sum(len(cTable) for cTable in self.dicContigs.values())
+
+class genome_lru:
+    '''the parsed genomes of --serve and --batch, used instead of the dictionary in get_genbank.
+    If all genomes together have more than iMaxFeatures features, the ones which were used longest ago are dropped.
+    A genome is also dropped if its file changed on disk, so that it is read again
+    '''
+    def __init__(self,iMaxFeatures):
+        self.iMaxFeatures = iMaxFeatures
+        self.dicGenomes = collections.OrderedDict()
+        self.dicStat = dict()
+        self.dicFeatures = dict()
+        self.iFeatures = 0
+
+    def __len__(self):
+        return len(self.dicGenomes)
+
+    def get_stat(self,sKey):
+        try:
+            cStat = os.stat(sKey)
+        except OSError:
+            return None
+        return (cStat.st_size,cStat.st_mtime_ns)
+
+    def __contains__(self,sKey):
+        if not sKey in self.dicGenomes:
+            return False
+        if self.get_stat(sKey)!=self.dicStat[sKey]:
+            self.remove(sKey)
+            return False
+        return True
+
+    def __getitem__(self,sKey):
+        self.dicGenomes.move_to_end(sKey)
+        return self.dicGenomes[sKey]
+
+    def __setitem__(self,sKey,cGenome):
+        if sKey in self.dicGenomes:
+            self.remove(sKey)
+        self.dicGenomes[sKey] = cGenome
+        self.dicStat[sKey] = self.get_stat(sKey)
+        self.dicFeatures[sKey] = cGenome.count_features()
+        self.iFeatures += self.dicFeatures[sKey]
+        #the newest genome is always kept, also if it alone is too big
+        while self.iFeatures>self.iMaxFeatures and len(self.dicGenomes)>1:
+            self.remove(next(iter(self.dicGenomes)))
+
+    def __delitem__(self,sKey):
+        self.remove(sKey)
+
+    def remove(self,sKey):
+        del self.dicGenomes[sKey]
+        del self.dicStat[sKey]
+        self.iFeatures -= self.dicFeatures.pop(sKey)
+
+
+class colour_rules:
+    '''very simple colouring scheme. Colours from the colour file (hex colours) for single identifiers come first,
+    then the rules: (keyword, colour) pairs, where the keyword is searched in the product, or ("type=tRNA", colour) for an entry type.
+    The first rule which fits wins, everything else is grey.
+    All keywords are compiled into one regex. The colours are only looked up for entries which are plotted,
+    and are remembered per product and type, since the same products come up again and again
+    '''
+    def __init__(self,lRules,dicColor=None):
+        self.dicColor = dicColor or dict()
+        self.lColours = []
+        self.dicTypes = dict()
+        self.lGroupRule = [] #regex group -> rule
+        lPatterns = []
+        for sKey,sColour in lRules:
+            if sKey.startswith("type="):
+                self.dicTypes.setdefault(sKey[5:],len(self.lColours))
+            else:
+                self.lGroupRule.append(len(self.lColours))
+                lPatterns.append("("+re.escape(sKey.lower())+")")
+            self.lColours.append(sColour)
+        #the lookahead matches at every position, and there the first keyword in the list which fits.
+        #The best rule is then the lowest over all positions, also if keywords overlap
+        self.reKeywords = re.compile("(?="+"|".join(lPatterns)+")") if lPatterns else None
+        self.dicKnown = dict()
+
+    def get_rule_colour(self,sProduct,sType):
+        tKey = (sProduct,sType)
+        if not tKey in self.dicKnown:
+            iBest = self.dicTypes.get(sType,len(self.lColours))
+            if self.reKeywords:
+                for cMatch in self.reKeywords.finditer(sProduct.lower()):
+                    iBest = min(iBest,self.lGroupRule[cMatch.lastindex-1])
+            self.dicKnown[tKey] = check_colour(self.lColours[iBest] if iBest<len(self.lColours) else "grey")
+        return self.dicKnown[tKey]
+
+    def get_colour(self,cEntry):
+        for sId in (cEntry.sLocus,cEntry.sOldLocus,cEntry.sProtein,cEntry.sGeneName,cEntry.sProduct):
+            if sId in self.dicColor:
+                return check_colour(self.dicColor[sId])
+        return self.get_rule_colour(cEntry.sProduct,cEntry.sType)
+
+def check_colour(sColour):
+    '''falls back to grey for invalid hex colours
+    '''
     
-    sAnno = newEntry.sProduct.lower()
-    if newEntry.sLocus in dicColor:
-        return dicColor.get(newEntry.sLocus)
-    if newEntry.sOldLocus in dicColor:
-        return dicColor.get(newEntry.sOldLocus)    
-    if newEntry.sProtein in dicColor:
-        return dicColor.get(newEntry.sProtein)      
-    if newEntry.sGeneName in dicColor:
-        return dicColor.get(newEntry.sGeneName)
-    if newEntry.sProduct in dicColor:
-        return dicColor.get(newEntry.sProduct)
-    if newEntry.sType=="tRNA" or newEntry.sType=="rRNA":
-        return "#FF00FF"
-    if "transpos" in sAnno or "phage" in sAnno or "integras" in sAnno:
-        return "red"
-    if "flagel" in sAnno:
-        return "#800000"
-    if "transport" in sAnno or "abc " in sAnno or "pts " in sAnno or "mfs" in sAnno or "membrane" in sAnno:
-        return "#008000" # green
-    if "ase " in sAnno:
-        return "blue"
-    if "ribosom" in sAnno:
-        return "#00FF00" # lime
-    return "grey"
+    if sColour.startswith("#") and not isrgbcolor(sColour):
+        print (sColour," is not a valid hex colour, falling back to grey")
+        return "grey"
+    return sColour
 
 def hasNumbers(inputString):
     return any(char.isdigit() for char in inputString)
@@ -127,44 +557,62 @@ def isrgbcolor(value):
     '''
     return bool(_rgbstring.match(value))
 
-def read_genbank(sFile,dicColor):
+def iter_genbank(inputFile,dicInfo,sForceContig=None):
     """Basic function to read genbank files.
     Does not parse everything, only what is relevant.
     I did not want to use bio-python, because in this way I am independent,
     and this function is not that complicated to write.
     Although it begins to get long now, but most things should be covered
+
+    Works on the lines of a file opened in binary mode, and gives out (contig,entry) one by one as soon as the entry
+    is complete, so the caller can stop reading whenever it has what it needs. The contig is the name from the LOCUS line,
+    or sForceContig if it is given (for a single record, which was already named by index_records).
+    The organism name goes into dicInfo["name"], the length of each contig into dicInfo["lengths"].
+    The sequence after ORIGIN is skipped without decoding it
     """
-    print ("processing: ",sFile)
-    lEntry = []
-    inputFile = open(sFile)
     cNewEntry = ""
     bRead = False
-    sName = ""
-    for lines in inputFile:
-        lines = lines.strip("\n")
+    sName = dicInfo.get("name","")
+    sContig = ""
+    setSeen = dicInfo.setdefault("contigs",set())
+    dicLength = dicInfo.setdefault("lengths",dict())
+    for bLines in inputFile:
+        lines = bLines.decode("utf-8","replace").strip("\r\n")
+        if lines.startswith("LOCUS"):
+            if cNewEntry:
+                yield sContig,cNewEntry
+                cNewEntry = ""
+            sContig = sForceContig or get_contig_name(lines,setSeen)
+            dicLength[sContig] = get_contig_length(lines)
         if lines.startswith("                     /organism="):
             sName = sanitize_organism_name(lines)
+            dicInfo["name"] = sName
         if lines.startswith("                     /strain="):
             sStrain = lines.strip().split("=")[1].strip(chr(34))
             if not sStrain in sName:
                 sName = sName+" str. "+sStrain
+                dicInfo["name"] = sName
         if lines.startswith("                     /sub_strain="):
             sSub = lines.strip().split("=")[1].strip(chr(34))
             if not sSub in sName:
                 sName = sName+" substr. "+sSub                
+                dicInfo["name"] = sName
         if lines.startswith("     gene            "):
             bRead = True
         if not bRead:continue
         if lines.startswith("ORIGIN"):
             bRead = False
+            if cNewEntry:
+                yield sContig,cNewEntry
+                cNewEntry = ""
+            #the sequence is usually most of the file, and is not needed at all
+            for bLines in inputFile:
+                if bLines[:2]==b"//":break
+            continue
         if lines.startswith("     ") and not lines.startswith("                     ") and not "source" in lines:
             if cNewEntry:
-                cNewEntry.sColour = get_colour(cNewEntry,dicColor)
-                lEntry.append(cNewEntry)
-                if cNewEntry.sColour.startswith("#"):
-                    if not isrgbcolor(cNewEntry.sColour):
-                        print (cNewEntry.sColour," is not a valid hex colour, falling back to grey")
-                        cNewEntry.sColour = "grey"
+                yield sContig,cNewEntry
+                cNewEntry = ""
             if lines.count("..")<=1 or lines.endswith(")"):
                 bSingleLine = True
             else:
@@ -220,10 +668,922 @@ def read_genbank(sFile,dicColor):
             sProtein = lines.split("=")[1]
             cNewEntry.sProtein = sProtein
 
+    if cNewEntry:
+        yield sContig,cNewEntry
+
+def get_contig_name(sLine,setSeen):
+    '''name of a record from its LOCUS line. If the name was already used in the file, a number is attached,
+    so that the records stay apart
+    '''
+    
+    lData = sLine.split()
+    sContig = ""
+    if len(lData)>1:
+        sContig = lData[1]
+    if sContig in setSeen:
+        i = 2
+        while sContig+"_"+str(i) in setSeen:
+            i += 1
+        sContig = sContig+"_"+str(i)
+    setSeen.add(sContig)
+    return sContig
+
+def get_contig_length(sLine):
+    '''length in bp of a record from its LOCUS line, e.g. LOCUS NC_000913 4641652 bp DNA circular. 0 if it is not there
+    '''
+    
+    lData = sLine.split()
+    for i in range(2,len(lData)-1):
+        if lData[i+1] in ("bp","aa") and lData[i].isdigit():
+            return int(lData[i])
+    return 0
+
+def index_records(mm):
+    '''finds the records (LOCUS lines) in a memory mapped genbank file.
+    Returns for each record [contig name, start offset, offset of ORIGIN (end of the features), end offset]
+    '''
+    
+    lStarts = []
+    if mm[:5]==b"LOCUS":
+        lStarts.append(0)
+    iPos = mm.find(b"\nLOCUS")
+    while iPos!=-1:
+        lStarts.append(iPos+1)
+        iPos = mm.find(b"\nLOCUS",iPos+1)
+    lRecords = []
+    setSeen = set()
+    for iStart in lStarts:
+        iLineEnd = mm.find(b"\n",iStart)
+        if iLineEnd==-1:
+            iLineEnd = len(mm)
+        sContig = get_contig_name(mm[iStart:iLineEnd].decode("utf-8","replace"),setSeen)
+        lRecords.append([sContig,iStart,0,0])
+    for i,lRecord in enumerate(lRecords):
+        iEnd = len(mm)
+        if i+1<len(lRecords):
+            iEnd = lRecords[i+1][1]
+        iOrigin = mm.find(b"\nORIGIN",lRecord[1],iEnd)
+        lRecord[2] = iOrigin+1 if iOrigin!=-1 else iEnd
+        lRecord[3] = iEnd
+    return lRecords
+
+def get_gene_regex(sGene):
+    '''regex for an identifier as the value of a qualifier, e.g. /locus_tag="sGene"
+    '''
+    return re.compile(b'="'+re.escape(sGene.encode("utf-8"))+b'"?\r?$',re.M)
+
+def find_records(mm,lRecords,setGenes):
+    '''returns the positions in lRecords of all records in which one of the identifiers appears as a qualifier value.
+    This is only a text search on the raw bytes, the real check happens after parsing.
+    If an identifier can't be found like this, all records are returned, to be on the safe side
+    '''
+    
+    lStarts = [lRecord[1] for lRecord in lRecords]
+    setFound = set()
+    for sGene in setGenes:
+        cRegex = get_gene_regex(sGene)
+        bFound = False
+        for cMatch in cRegex.finditer(mm):
+            i = bisect.bisect_right(lStarts,cMatch.start())-1
+            if i>=0 and cMatch.start()<lRecords[i][2]:
+                setFound.add(i)
+                bFound = True
+        if not bFound:
+            return list(range(len(lRecords)))
+    return sorted(setFound)
+
+def get_compression(sFile):
+    '''the compression of a file from its first bytes, not from the file name: "gzip", "bgzip", "bz2", "xz",
+    or "" for uncompressed files. "-" is stdin
+    '''
+    
+    if sFile=="-":
+        bMagic = sys.stdin.buffer.peek(18)[:18]
+    else:
+        with open(sFile,"rb") as inputFile:
+            bMagic = inputFile.read(18)
+    if bMagic[:2]==b"\x1f\x8b":
+        #bgzip is gzip with extra fields in the header, the BC field has the size of the block
+        if len(bMagic)>=14 and bMagic[3]&4 and bMagic[12:14]==b"BC":
+            return "bgzip"
+        return "gzip"
+    if bMagic[:3]==b"BZh":
+        return "bz2"
+    if bMagic[:6]==b"\xfd7zXZ\x00":
+        return "xz"
+    return ""
+
+def open_file(sFile):
+    '''opens a file for reading in binary mode. "-" is stdin.
+    Compressed files (see get_compression) are decompressed while reading, without writing them anywhere
+    '''
+    
+    sCompression = get_compression(sFile)
+    source = sys.stdin.buffer if sFile=="-" else sFile
+    if sCompression=="gzip" or sCompression=="bgzip":
+        import gzip
+        return gzip.open(source,"rb")
+    if sCompression=="bz2":
+        import bz2
+        return bz2.open(source,"rb")
+    if sCompression=="xz":
+        import lzma
+        return lzma.open(source,"rb")
+    if sFile=="-":
+        return source
+    return open(sFile,"rb")
+
+def open_text(sFile):
+    '''open_file, but for text files like the input csv file
+    '''
+    return io.TextIOWrapper(open_file(sFile))
+
+def is_input(sFile):
+    return sFile=="-" or os.path.isfile(sFile)
+
+def get_file_key(sFile):
+    '''the name under which a file is kept in the caches, the real path, or "-" for stdin
+    '''
+    if sFile=="-":
+        return sFile
+    return os.path.realpath(sFile)
+
+class bgzf_file:
+    '''random access to a bgzip compressed file (e.g. from bgzip of htslib). These consist of gzip blocks of at most 64 kb,
+    and the header of each block has its compressed size (BSIZE), the end its uncompressed size.
+    So all blocks are found without decompressing anything, and read() only decompresses the blocks of the wanted part.
+    The records (see index_records) are found block by block, only as far as they are needed (see iter_records)
+    '''
+    def __init__(self,sFile):
+        self.sFile = sFile
+        lCompressed = []
+        lUncompressed = [0]
+        iPos = 0
+        with open(sFile,"rb") as inputFile:
+            while True:
+                inputFile.seek(iPos)
+                bHeader = inputFile.read(18)
+                if len(bHeader)<18:
+                    break
+                if bHeader[:2]!=b"\x1f\x8b" or bHeader[12:14]!=b"BC":
+                    raise PlotError(sFile+" is not a valid bgzip file")
+                iSize = int.from_bytes(bHeader[16:18],"little")+1
+                inputFile.seek(iPos+iSize-4)
+                lCompressed.append(iPos)
+                lUncompressed.append(lUncompressed[-1]+int.from_bytes(inputFile.read(4),"little"))
+                iPos += iSize
+        lCompressed.append(iPos)
+        self.aCompressed = np.array(lCompressed,dtype=np.int64)
+        self.aUncompressed = np.array(lUncompressed,dtype=np.int64)
+        self.lRecords = []
+        self.iScanned = 0 #blocks searched for records so far, None when the whole file was searched
+        self.bTail = b"" #the unfinished last line of the searched blocks
+        self.setSeen = set() #contig names so far, see get_contig_name
+
+    def __len__(self):
+        return int(self.aUncompressed[-1])
+
+    def read(self,iStart,iStop):
+        '''the uncompressed bytes from iStart to iStop
+        '''
+        import gzip
+        
+        iFirst = int(np.searchsorted(self.aUncompressed,iStart,side="right"))-1
+        iLast = int(np.searchsorted(self.aUncompressed,iStop,side="left"))
+        with open(self.sFile,"rb") as inputFile:
+            inputFile.seek(self.aCompressed[iFirst])
+            bData = gzip.decompress(inputFile.read(int(self.aCompressed[iLast]-self.aCompressed[iFirst])))
+        iOffset = int(self.aUncompressed[iFirst])
+        return bData[iStart-iOffset:iStop-iOffset]
+
+    def scan_block(self,inputFile):
+        '''decompresses the next block and notes the LOCUS and ORIGIN lines in it in self.lRecords
+        '''
+        import gzip
+        
+        i = self.iScanned
+        if i>=len(self.aCompressed)-1:
+            #end of the file, the last line may have no line break
+            bText = self.bTail
+            iCut = len(bText)
+        else:
+            inputFile.seek(self.aCompressed[i])
+            bText = self.bTail+gzip.decompress(inputFile.read(int(self.aCompressed[i+1]-self.aCompressed[i])))
+            iCut = bText.rfind(b"\n")+1
+        iBase = int(self.aUncompressed[min(i,len(self.aUncompressed)-1)])-len(self.bTail)
+        for cMatch in re.finditer(rb"^(?:LOCUS|ORIGIN)",bText[:iCut],re.M):
+            iPos = iBase+cMatch.start()
+            if bText[cMatch.start()]==ord("L"):
+                if self.lRecords:
+                    self.lRecords[-1][2] = self.lRecords[-1][2] or iPos
+                    self.lRecords[-1][3] = iPos
+                iLineEnd = bText.find(b"\n",cMatch.start())
+                sLine = bText[cMatch.start():iLineEnd if iLineEnd!=-1 else len(bText)].decode("utf-8","replace").strip()
+                self.lRecords.append([get_contig_name(sLine,self.setSeen),iPos,0,0])
+            elif self.lRecords and not self.lRecords[-1][2]:
+                self.lRecords[-1][2] = iPos
+        self.bTail = bText[iCut:]
+        if i>=len(self.aCompressed)-1:
+            if self.lRecords:
+                self.lRecords[-1][3] = len(self)
+                self.lRecords[-1][2] = self.lRecords[-1][2] or len(self)
+            self.iScanned = None
+        else:
+            self.iScanned += 1
+
+    def iter_records(self):
+        '''like index_records, [contig name, start offset, offset of ORIGIN, end offset] for each record, one after the other.
+        A record is given out as soon as its features are complete, so that a reader which stops early does not decompress
+        the rest of the file. What was found is kept for the next call. The end offset is only known after the next record was found
+        '''
+        i = 0
+        with open(self.sFile,"rb") as inputFile:
+            while True:
+                while self.iScanned is not None and (i>=len(self.lRecords) or not self.lRecords[i][2]):
+                    self.scan_block(inputFile)
+                if i>=len(self.lRecords):
+                    return
+                yield self.lRecords[i]
+                i += 1
+
+    def get_records(self):
+        '''all records, see iter_records
+        '''
+        for lRecord in self.iter_records():
+            pass
+        return self.lRecords
+
+    def find_records(self,setGenes):
+        '''like find_records, but the records are searched one after the other (see iter_records), and only the features of each
+        record are decompressed, not the sequence. Gives out the positions of the records in which one of the identifiers appears.
+        If an identifier is in none of them, the other records are given out at the end as well, to be on the safe side
+        '''
+        lRegex = [get_gene_regex(sGene) for sGene in setGenes]
+        lMissing = [True]*len(lRegex)
+        lSkipped = []
+        for i,(sContig,iStart,iOrigin,iEnd) in enumerate(self.iter_records()):
+            bFeatures = self.read(iStart,iOrigin)
+            bFound = False
+            for j,cRegex in enumerate(lRegex):
+                if cRegex.search(bFeatures):
+                    bFound = True
+                    lMissing[j] = False
+            if bFound:
+                yield i
+            else:
+                lSkipped.append(i)
+        if any(lMissing):
+            yield from lSkipped
+
+def get_bgzf(sFile):
+    '''the bgzf_file of a file. It is kept as long as the file does not change, so that a file which is read again for
+    other genes (--serve, --batch) can go straight to the records with these genes
+    '''
+    cStat = os.stat(sFile)
+    tKey = (os.path.realpath(sFile),cStat.st_size,cStat.st_mtime_ns)
+    if not tKey in _dicBgzf:
+        _dicBgzf[tKey] = bgzf_file(sFile)
+    return _dicBgzf[tKey]
+
+def iter_lines(mm,iStart,iStop):
+    '''the lines of a part of a memory mapped file
+    '''
+    mm.seek(iStart)
+    while mm.tell()<iStop:
+        yield mm.readline()
+
+def add_entries(cGenome,iterEntries,setGenes,sEntryType):
+    '''adds the entries from iter_genbank to the genome.
+    Returns True if all identifiers in setGenes have been seen, then the caller can stop reading.
+    The window is chosen by coordinates (see get_window), so after the last identifier reading goes on until an entry
+    starts behind the end of the wanted genes. If the entries of the contig are not sorted by position, entries of the window
+    can still come later, then the contig is read to its end
+    '''
+    
+    sLastContig = None #contig of the last wanted identifier, once all have been seen
+    sContigNow = None
+    iWindowEnd = 0 #end of the wanted genes on sContigNow
+    iPrevStart = 0
+    bSorted = True
+    for sContig,cNewEntry in iterEntries:
+        if sContig!=sContigNow:
+            sContigNow = sContig
+            iWindowEnd = 0
+            iPrevStart = 0
+            bSorted = True
+        if sLastContig is not None and (sContig!=sLastContig or (bSorted and cNewEntry.iStart>iWindowEnd)):
+            return True
+        if cNewEntry.iStart<iPrevStart:
+            bSorted = False
+        iPrevStart = max(iPrevStart,cNewEntry.iStart)
+        cGenome.add(sContig,cNewEntry)
+        if not setGenes:continue
+        if sEntryType and not cNewEntry.sType in sEntryType:continue
+        iWanted = len(setGenes)
+        for sId in (cNewEntry.sLocus,cNewEntry.sGeneName,cNewEntry.sProduct,cNewEntry.sOldLocus,cNewEntry.sProtein):
+            setGenes.discard(sId)
+        if len(setGenes)<iWanted:
+            iWindowEnd = max(iWindowEnd,cNewEntry.iStart,cNewEntry.iStop)
+        if not setGenes:
+            sLastContig = sContig
+    return sLastContig is not None
+
+def read_genbank(sFile,setGenes=None,sEntryType=None):
+    """reads a genbank file into a genome object, see iter_genbank.
+    If setGenes is given, the file is memory mapped, and only the records (contigs) in which these identifiers appear are parsed.
+    Reading stops as soon as all of them have been seen on an entry of the wanted type, and the entries have passed them
+    (see add_entries), everything behind them is not needed for plotting
+    Compressed files and stdin ("-") can't be memory mapped, they are read as a stream (see open_file), for bgzip files
+    only the blocks of the records with the genes are decompressed
+    """
+    print ("processing: ",sFile)
+    cGenome = genome()
+    dicInfo = {"name":""}
+    setWanted = None
+    if setGenes:
+        setWanted = set(setGenes)
+        #the genome is incomplete, this is noted so that it is not used for other genes
+        cGenome.setGenes = set(setGenes)
+        cGenome.lEntryType = sEntryType
+    sCompression = get_compression(sFile)
+    if setWanted and sCompression=="bgzip":
+        cBgzf = get_bgzf(sFile)
+        for i in cBgzf.find_records(setWanted):
+            sContig,iStart,iOrigin,iEnd = cBgzf.lRecords[i]
+            if add_entries(cGenome,iter_genbank(io.BytesIO(cBgzf.read(iStart,iOrigin)),dicInfo,sContig),setWanted,sEntryType):
+                break
+        cGenome.sName = dicInfo["name"]
+        cGenome.dicLength = dicInfo.get("lengths",dict())
+        cGenome.finish()
+        return cGenome
+    with open_file(sFile) as inputFile:
+        mm = None
+        lRecords = []
+        if setWanted and not sCompression and sFile!="-":
+            try:
+                mm = mmap.mmap(inputFile.fileno(),0,access=mmap.ACCESS_READ)
+                lRecords = index_records(mm)
+            except (ValueError,OSError):
+                pass #e.g. empty files can't be mapped, they are just read normally
+        if lRecords:
+            for i in find_records(mm,lRecords,setWanted):
+                sContig,iStart,iOrigin,iEnd = lRecords[i]
+                if add_entries(cGenome,iter_genbank(iter_lines(mm,iStart,iOrigin),dicInfo,sContig),setWanted,sEntryType):
+                    break
+        else:
+            add_entries(cGenome,iter_genbank(inputFile,dicInfo),setWanted,sEntryType)
+        if mm:
+            mm.close()
+    cGenome.sName = dicInfo["name"]
+    cGenome.dicLength = dicInfo.get("lengths",dict())
+    cGenome.finish()
+    return cGenome
+
+def hash_file(sFile):
+    '''sha1 of the file content, read in chunks so that big files don't end up in memory
+    '''
+    
+    cHash = hashlib.sha1()
+    with open(sFile,"rb") as inputFile:
+        for bChunk in iter(lambda: inputFile.read(1<<20),b""):
+            cHash.update(bChunk)
+    return cHash.hexdigest()
+
+def write_cache_file(sCacheFile,dicCache):
+    '''writes a cache file as npz: the arrays of the genome state (see genome.get_state) as arrays, everything else as json,
+    so that nothing in it is executed when it is loaded (no pickle, like the GFF3 index)
+    '''
+    dicState = dicCache["genome"]
+    dicArrays = {"strings":np.frombuffer(dicState["strings"][0],dtype=np.uint8),"string_offsets":dicState["strings"][1]}
+    lContigs = []
+    for sContig,dicTable in dicState["contigs"]:
+        dicPlain = dict()
+        dicNames = dict() #column -> name of the array in the file, or for dicts column -> {key -> name}
+        for sKey,value in dicTable.items():
+            if isinstance(value,np.ndarray):
+                dicNames[sKey] = "a"+str(len(dicArrays))
+                dicArrays[dicNames[sKey]] = value
+            elif isinstance(value,dict):
+                dicNames[sKey] = dict()
+                for sCol,aColumn in value.items():
+                    dicNames[sKey][sCol] = "a"+str(len(dicArrays))
+                    dicArrays[dicNames[sKey][sCol]] = aColumn
+            else:
+                dicPlain[sKey] = value
+        lContigs.append([sContig,dicPlain,dicNames])
+    dicMeta = dict((sKey,value) for sKey,value in dicCache.items() if sKey!="genome")
+    dicMeta.update({"name":dicState["name"],"lengths":dicState["lengths"],"contigs":lContigs})
+    dicArrays["meta"] = np.frombuffer(json.dumps(dicMeta).encode("utf-8"),dtype=np.uint8)
+    with open(sCacheFile,"wb") as cacheFile:
+        np.savez(cacheFile,**dicArrays)
 
-    cNewEntry.sColour = get_colour(cNewEntry,dicColor)
-    lEntry.append(cNewEntry)
-    return lEntry,sName
+def read_cache_file(sCacheFile):
+    '''the reverse of write_cache_file
+    '''
+    with np.load(sCacheFile,allow_pickle=False) as dicArrays:
+        dicCache = json.loads(dicArrays["meta"].tobytes().decode("utf-8"))
+        if dicCache.get("version")!=CACHE_VERSION:
+            return dicCache
+        lContigs = []
+        for sContig,dicTable,dicNames in dicCache.pop("contigs"):
+            for sKey,name in dicNames.items():
+                if isinstance(name,dict):
+                    dicTable[sKey] = dict((sCol,dicArrays[sName]) for sCol,sName in name.items())
+                else:
+                    dicTable[sKey] = dicArrays[name]
+            lContigs.append((sContig,dicTable))
+        dicCache["genome"] = {"name":dicCache.pop("name"),"lengths":dicCache.pop("lengths"),"contigs":lContigs,
+                              "strings":(dicArrays["strings"].tobytes(),dicArrays["string_offsets"])}
+    return dicCache
+
+def read_genbank_cached(sFile,sCacheDir):
+    '''reads a genbank file via the cache directory. The cache file stores the parsed entries per contig and the organism name,
+    and is only used if path, size and modification time still fit. If only size/time changed (e.g. a copy),
+    the content hash decides
+    '''
+    
+    sPath = os.path.realpath(sFile)
+    cStat = os.stat(sPath)
+    sCacheFile = os.path.join(sCacheDir,hashlib.sha1(sPath.encode("utf-8")).hexdigest()+".gpc")
+    dicCache = None
+    if os.path.isfile(sCacheFile):
+        try:
+            dicCache = read_cache_file(sCacheFile)
+        except Exception:
+            print ("could not read cache file "+sCacheFile+", ignoring it")
+        if dicCache and (dicCache.get("version")!=CACHE_VERSION or dicCache.get("path")!=sPath):
+            dicCache = None
+    sHash = ""
+    if dicCache and (dicCache["size"]!=cStat.st_size or dicCache["mtime"]!=cStat.st_mtime_ns):
+        sHash = hash_file(sPath)
+        if sHash!=dicCache["hash"]:
+            dicCache = None
+    if dicCache:
+        print ("processing: ",sFile," (from cache)")
+        cGenome = genome()
+        cGenome.set_state(dicCache["genome"])
+        if not sHash:
+            return cGenome
+    else:
+        cGenome = read_genbank(sFile)
+    #(re-)write the cache file, either because it is new, or because size/time need to be updated
+    if not sHash:
+        sHash = hash_file(sPath)
+    dicCache = {"version":CACHE_VERSION,"path":sPath,"size":cStat.st_size,"mtime":cStat.st_mtime_ns,"hash":sHash,"genome":cGenome.get_state()}
+    os.makedirs(sCacheDir,exist_ok=True)
+    sTmp = sCacheFile+"."+str(os.getpid())+".tmp"
+    write_cache_file(sTmp,dicCache)
+    os.replace(sTmp,sCacheFile)
+    return cGenome
+
+def is_gff(sFile):
+    '''GFF3 files are recognised by their name (.gff or .gff3, also compressed, e.g. .gff3.gz),
+    or by the ##gff-version line at the start of uncompressed files and stdin
+    '''
+    sName = sFile.lower()
+    for sExt in (".gz",".bgz",".bz2",".xz"):
+        if sName.endswith(sExt):
+            sName = sName[:-len(sExt)]
+    if sName.endswith((".gff",".gff3")):
+        return True
+    if sFile=="-":
+        return sys.stdin.buffer.peek(13)[:13]==b"##gff-version"
+    with open(sFile,"rb") as inputFile:
+        return inputFile.read(13)==b"##gff-version"
+
+def parse_gff_line(bLine):
+    '''one feature line of a GFF3 file as (seqid,type,start,end,complement,attributes), None for comments and broken lines
+    '''
+    from urllib.parse import unquote
+    
+    if bLine[:1]==b"#":
+        return None
+    lData = bLine.decode("utf-8","replace").rstrip("\r\n").split("\t")
+    if len(lData)<9 or not lData[3].isdigit() or not lData[4].isdigit():
+        return None
+    dicAttr = dict()
+    for sItem in lData[8].split(";"):
+        if "=" in sItem:
+            sKey,sValue = sItem.split("=",1)
+            dicAttr[sKey.strip()] = unquote(sValue)
+    return unquote(lData[0]),lData[2],int(lData[3]),int(lData[4]),lData[6]=="-",dicAttr
+
+def iter_gff(iterLines,dicInfo):
+    '''reads the lines (bytes) of a GFF3 file, and gives out (contig,entry) like iter_genbank, so the entries are the same as from genbank files.
+    The parts of a feature are put together: exons go to their parent (e.g. the mRNA or tRNA), whose exons they become,
+    CDS lines with the same ID or parent are one CDS, with the CDS lines as exons. Lines with the same ID are one feature.
+    Identifiers which a feature does not have are taken from its parents, e.g. the gene name and locus tag of a CDS from its gene.
+    As the parents are needed, all lines are read before the first entry is given out.
+    The contig is the seqid, its length goes into dicInfo["lengths"]
+    '''
+    
+    dicLength = dicInfo.setdefault("lengths",dict())
+    lFeatures = []
+    dicMerge = dict()
+    dicById = dict()
+    dicExons = dict()
+    for bLine in iterLines:
+        if bLine.startswith(b"##sequence-region"):
+            lData = bLine.decode("utf-8","replace").split()
+            if len(lData)>=4 and lData[3].isdigit():
+                dicLength[lData[1]] = int(lData[3])
+            continue
+        if bLine.startswith(b"##FASTA"):
+            break
+        tLine = parse_gff_line(bLine)
+        if tLine is None:continue
+        sSeq,sType,iStart,iStop,bCompl,dicAttr = tLine
+        if sType in lGffWhole:
+            dicLength.setdefault(sSeq,iStop)
+            continue
+        lParents = dicAttr["Parent"].split(",") if "Parent" in dicAttr else []
+        if sType=="exon" and lParents:
+            for sParent in lParents:
+                dicExons.setdefault(sParent,[]).append([iStart,iStop])
+            continue
+        if sType in lGffParts:continue
+        sId = dicAttr.get("ID","")
+        sKey = "CDS\t"+(sId or ",".join(lParents)) if sType=="CDS" else sId
+        if sKey and sKey in dicMerge:
+            #another line of the same feature
+            lFeature = dicMerge[sKey]
+            lFeature[2] = min(lFeature[2],iStart)
+            lFeature[3] = max(lFeature[3],iStop)
+            lFeature[6].append([iStart,iStop])
+            continue
+        lFeature = [sSeq,sType,iStart,iStop,bCompl,dicAttr,[[iStart,iStop]]]
+        lFeatures.append(lFeature)
+        if sKey:
+            dicMerge[sKey] = lFeature
+        if sId:
+            dicById[sId] = lFeature
+
+    def get_attr(dicAttr,sKey):
+        #the attribute of the feature or of the nearest parent which has it
+        for i in range(20): #a parent loop in a broken file should not hang
+            if dicAttr.get(sKey):
+                return dicAttr[sKey]
+            lParent = dicById.get(dicAttr.get("Parent","").split(",")[0])
+            if lParent is None:
+                return ""
+            dicAttr = lParent[5]
+        return ""
+
+    for sSeq,sType,iStart,iStop,bCompl,dicAttr,lParts in lFeatures:
+        lExons = lParts
+        if sType!="CDS" and dicAttr.get("ID") in dicExons:
+            lExons = dicExons[dicAttr["ID"]]
+            iStart = min(iStart,min(exons[0] for exons in lExons))
+            iStop = max(iStop,max(exons[1] for exons in lExons))
+        cNewEntry = entry(sType,iStart,iStop,bCompl)
+        if len(lExons)>1:
+            cNewEntry.lExons = sorted(lExons)
+            for i in range(len(cNewEntry.lExons)-1):
+                cNewEntry.lIntrons.append([cNewEntry.lExons[i][1],cNewEntry.lExons[i+1][0]])
+        cNewEntry.sLocus = get_attr(dicAttr,"locus_tag") or dicAttr.get("ID","")
+        cNewEntry.sGeneName = get_attr(dicAttr,"gene") or (dicAttr.get("Name","") if sType=="gene" else "")
+        if not cNewEntry.sGeneName:
+            #e.g. Ensembl: only the gene has a Name
+            lParent = dicById.get(dicAttr.get("Parent","").split(",")[0])
+            for i in range(20):
+                if lParent is None:break
+                if lParent[1]=="gene" or not "Parent" in lParent[5]:
+                    cNewEntry.sGeneName = lParent[5].get("Name","")
+                    break
+                lParent = dicById.get(lParent[5]["Parent"].split(",")[0])
+        cNewEntry.sProduct = get_attr(dicAttr,"product")
+        cNewEntry.sOldLocus = get_attr(dicAttr,"old_locus_tag")
+        cNewEntry.sProtein = get_attr(dicAttr,"protein_id")
+        yield sSeq,cNewEntry
+
+class gff_index:
+    '''coordinate and identifier index of a GFF3 file, so that only the lines of the wanted regions are read (see read_gff).
+    Made with one pass over the file. Like the linear index of tabix, it has for each seqid (contig) and bin of GFF_BIN bp
+    the first and the last byte of the lines which overlap the bin. The bytes are counted in the uncompressed file,
+    for bgzip files bgzf_file finds the blocks for them. Identifiers (ID, Name, gene, locus_tag, old_locus_tag, protein_id,
+    product) point to the region of the top level feature they belong to, e.g. the gene of a CDS.
+    Without sFile the index is empty, for load()
+    '''
+    lIdKeys = ["ID","Name","gene","locus_tag","old_locus_tag","protein_id","product"]
+
+    def __init__(self,sFile=None):
+        from urllib.parse import unquote
+        
+        self.dicLength = dict()
+        self.dicIds = dict()
+        self.dicBins = dict()
+        if sFile is None:
+            return
+        dicLines = dict()
+        dicRoot = dict()
+        iPos = 0
+        with open_file(sFile) as inputFile:
+            for bLine in inputFile:
+                iLineStart = iPos
+                iPos += len(bLine)
+                if bLine[:1]==b"#":
+                    if bLine.startswith(b"##sequence-region"):
+                        lData = bLine.decode("utf-8","replace").split()
+                        if len(lData)>=4 and lData[3].isdigit():
+                            self.dicLength[lData[1]] = int(lData[3])
+                    elif bLine.startswith(b"##FASTA"):
+                        break
+                    continue
+                lData = bLine.decode("utf-8","replace").rstrip("\r\n").split("\t")
+                if len(lData)<9 or not lData[3].isdigit() or not lData[4].isdigit():continue
+                sSeq = unquote(lData[0])
+                iStart = int(lData[3])
+                iStop = int(lData[4])
+                if lData[2] in lGffWhole:
+                    self.dicLength.setdefault(sSeq,iStop)
+                    continue
+                if not sSeq in dicLines:
+                    dicLines[sSeq] = [array.array("q") for i in range(4)]
+                for aColumn,iValue in zip(dicLines[sSeq],(iStart,iStop,iLineStart,iPos)):
+                    aColumn.append(iValue)
+                dicAttr = dict(sItem.split("=",1) for sItem in lData[8].split(";") if "=" in sItem)
+                tRoot = dicRoot.get(dicAttr.get("Parent","").split(",")[0],(sSeq,iStart,iStop))
+                if "ID" in dicAttr:
+                    dicRoot.setdefault(dicAttr["ID"],tRoot)
+                for sKey in self.lIdKeys:
+                    if sKey in dicAttr:
+                        self.dicIds.setdefault(unquote(dicAttr[sKey]),tRoot)
+        for sSeq,(aStart,aStop,aLineStart,aLineEnd) in dicLines.items():
+            aStart = np.array(aStart,dtype=np.int64)
+            aStop = np.array(aStop,dtype=np.int64)
+            aFirst = aStart//GFF_BIN
+            aCounts = aStop//GFF_BIN-aFirst+1
+            #every line is put into all bins it overlaps
+            aBin = np.repeat(aFirst,aCounts)+np.arange(aCounts.sum())-np.repeat(np.cumsum(aCounts)-aCounts,aCounts)
+            iBins = int(aBin.max())+1
+            aMin = np.full(iBins,np.iinfo(np.int64).max,dtype=np.int64)
+            aMax = np.full(iBins,-1,dtype=np.int64)
+            np.minimum.at(aMin,aBin,np.repeat(np.array(aLineStart,dtype=np.int64),aCounts))
+            np.maximum.at(aMax,aBin,np.repeat(np.array(aLineEnd,dtype=np.int64),aCounts))
+            self.dicBins[sSeq] = (aMin,aMax)
+            self.dicLength.setdefault(sSeq,int(aStop.max()))
+
+    def save(self,sIndexFile,tKey):
+        '''writes the index as npz file: the bins as arrays, everything else as json, so that nothing in it is executed
+        when it is loaded (no pickle). tKey is path, size and modification time of the GFF3 file
+        '''
+        dicArrays = dict()
+        lSeqs = list(self.dicBins)
+        for i,sSeq in enumerate(lSeqs):
+            dicArrays["min"+str(i)],dicArrays["max"+str(i)] = self.dicBins[sSeq]
+        sMeta = json.dumps({"version":CACHE_VERSION,"key":list(tKey),"bin":GFF_BIN,"seqs":lSeqs,"lengths":self.dicLength,"ids":self.dicIds})
+        dicArrays["meta"] = np.frombuffer(sMeta.encode("utf-8"),dtype=np.uint8)
+        with open(sIndexFile,"wb") as indexFile:
+            np.savez(indexFile,**dicArrays)
+
+    def load(self,sIndexFile,tKey):
+        '''the reverse of save. Returns False if the file is for another version or another state of the GFF3 file
+        '''
+        with np.load(sIndexFile,allow_pickle=False) as dicArrays:
+            dicMeta = json.loads(dicArrays["meta"].tobytes().decode("utf-8"))
+            if dicMeta["version"]!=CACHE_VERSION or dicMeta["key"]!=list(tKey) or dicMeta["bin"]!=GFF_BIN:
+                return False
+            for i,sSeq in enumerate(dicMeta["seqs"]):
+                self.dicBins[sSeq] = (dicArrays["min"+str(i)],dicArrays["max"+str(i)])
+        self.dicLength = dicMeta["lengths"]
+        self.dicIds = dict((sId,tuple(lRoot)) for sId,lRoot in dicMeta["ids"].items())
+        return True
+
+    def get_span(self,sSeq,iStart,iStop):
+        '''first and last byte of the lines which overlap the region (and maybe a few more), or None
+        '''
+        if not sSeq in self.dicBins:
+            return None
+        aMin,aMax = self.dicBins[sSeq]
+        iFirst = max(0,iStart//GFF_BIN)
+        iLast = min(len(aMin)-1,iStop//GFF_BIN)
+        if iFirst>iLast or aMax[iFirst:iLast+1].max()<0:
+            return None
+        return int(aMin[iFirst:iLast+1].min()),int(aMax[iFirst:iLast+1].max())
+
+def get_gff_index(sFile,sIndexDir=""):
+    '''the gff_index of a file. It is kept in memory as long as the file does not change (like get_bgzf), and with
+    sIndexDir (the --cache_dir) also on disk for the next runs. Nothing is written next to the GFF3 file
+    '''
+    sPath = os.path.realpath(sFile)
+    cStat = os.stat(sPath)
+    tKey = (sPath,cStat.st_size,cStat.st_mtime_ns)
+    if tKey in _dicGffIndex:
+        return _dicGffIndex[tKey]
+    cIndex = None
+    sIndexFile = ""
+    if sIndexDir:
+        sIndexFile = os.path.join(sIndexDir,hashlib.sha1(sPath.encode("utf-8")).hexdigest()+".gpi.npz")
+    if sIndexFile and os.path.isfile(sIndexFile):
+        cIndex = gff_index()
+        try:
+            if not cIndex.load(sIndexFile,tKey):
+                cIndex = None
+        except Exception:
+            print ("could not read index file "+sIndexFile+", making it again")
+            cIndex = None
+    if cIndex is None:
+        print ("indexing: ",sFile)
+        cIndex = gff_index(sFile)
+        if sIndexFile:
+            os.makedirs(sIndexDir,exist_ok=True)
+            sTmp = sIndexFile+"."+str(os.getpid())+".tmp"
+            cIndex.save(sTmp,tKey)
+            os.replace(sTmp,sIndexFile)
+    _dicGffIndex[tKey] = cIndex
+    return cIndex
+
+def read_bytes(sFile,iStart,iStop):
+    '''the bytes from iStart to iStop of an uncompressed or bgzip file, for bgzip counted in the uncompressed file
+    '''
+    if get_compression(sFile)=="bgzip":
+        return get_bgzf(sFile).read(iStart,iStop)
+    with open(sFile,"rb") as inputFile:
+        inputFile.seek(iStart)
+        return inputFile.read(iStop-iStart)
+
+def merge_ranges(lRanges):
+    lMerged = []
+    for iStart,iStop in sorted(lRanges):
+        if lMerged and iStart<=lMerged[-1][1]+1:
+            lMerged[-1][1] = max(lMerged[-1][1],iStop)
+        else:
+            lMerged.append([iStart,iStop])
+    return lMerged
+
+def read_gff_lines(sFile,cIndex,sSeq,lRanges):
+    '''the lines of seqid sSeq which are needed for the regions in lRanges. A region is extended until it has the whole
+    top level features which reach into it (a gene with all its mRNAs, exons and CDS), so that they are complete
+    '''
+    lRanges = merge_ranges(lRanges)
+    while True:
+        lSpans = merge_ranges([tSpan for tSpan in (cIndex.get_span(sSeq,iStart,iStop) for iStart,iStop in lRanges) if tSpan])
+        lLines = []
+        for iFirst,iLast in lSpans:
+            lLines.extend(bLine for bLine in read_bytes(sFile,iFirst,iLast).splitlines(True) if bLine.split(b"\t",1)[0].decode("utf-8","replace")==sSeq or bLine[:1]==b"#")
+        #the top level feature of each line, and how far it goes
+        dicFeatures = dict()
+        lParsed = []
+        for bLine in lLines:
+            tLine = parse_gff_line(bLine)
+            if tLine is None or tLine[1] in lGffWhole:continue
+            lParsed.append(tLine)
+            if "ID" in tLine[5]:
+                dicFeatures.setdefault(tLine[5]["ID"],tLine)
+        lNew = list(lRanges)
+        for tLine in lParsed:
+            if not any(tLine[2]<=iStop and tLine[3]>=iStart for iStart,iStop in lRanges):continue
+            tRoot = tLine
+            for i in range(20):
+                tParent = dicFeatures.get(tRoot[5].get("Parent","").split(",")[0])
+                if tParent is None:break
+                tRoot = tParent
+            lNew.append([min(tLine[2],tRoot[2]),max(tLine[3],tRoot[3])])
+        lNew = merge_ranges(lNew)
+        if lNew==lRanges:
+            return lLines
+        lRanges = lNew
+
+def read_gff(sFile,setWanted=None,sEntryType=None,sIndexDir=""):
+    '''reads a GFF3 file into a genome object, see iter_gff. If setWanted is given (identifiers and the rows from
+    get_wanted_genes), and the file is uncompressed or bgzip, only the lines of the wanted regions are read, with the help of
+    the index (see get_gff_index), so that plotting 20 kb of a huge annotation does not need to read all of it.
+    Other compressions and stdin are read completely
+    '''
+    print ("processing: ",sFile)
+    cGenome = genome()
+    dicInfo = {"name":""}
+    if not setWanted or sFile=="-" or not get_compression(sFile) in ("","bgzip"):
+        with open_file(sFile) as inputFile:
+            add_entries(cGenome,iter_gff(inputFile,dicInfo),None,sEntryType)
+        cGenome.dicLength = dicInfo["lengths"]
+        cGenome.finish()
+        return cGenome
+    cIndex = get_gff_index(sFile,sIndexDir)
+    dicRegions = dict()
+    def add_gene(sGene,iFlank=0):
+        if sGene in cIndex.dicIds:
+            sSeq,iStart,iStop = cIndex.dicIds[sGene]
+            dicRegions.setdefault(sSeq,[]).append([max(1,iStart-iFlank),iStop+iFlank])
+    for wanted in setWanted:
+        if not isinstance(wanted,tuple):
+            add_gene(wanted)
+        elif wanted[0]=="genes" and wanted[1] in cIndex.dicIds and wanted[2] in cIndex.dicIds:
+            #everything between start and stop gene, if they are on the same contig
+            tStart = cIndex.dicIds[wanted[1]]
+            tStop = cIndex.dicIds[wanted[2]]
+            if tStart[0]==tStop[0]:
+                dicRegions.setdefault(tStart[0],[]).append([min(tStart[1],tStop[1]),max(tStart[2],tStop[2])])
+        elif wanted[0]=="range":
+            sSeq = wanted[1] or next(iter(cIndex.dicLength),"")
+            dicRegions.setdefault(sSeq,[]).append([wanted[2],wanted[3]])
+        elif wanted[0]=="around":
+            add_gene(wanted[1],wanted[2])
+    lLines = []
+    for sSeq,lRanges in dicRegions.items():
+        lLines.extend(read_gff_lines(sFile,cIndex,sSeq,lRanges))
+    add_entries(cGenome,iter_gff(lLines,dicInfo),None,sEntryType)
+    cGenome.dicLength = dict(cIndex.dicLength)
+    cGenome.setGenes = set(setWanted)
+    cGenome.lEntryType = sEntryType
+    cGenome.finish()
+    return cGenome
+
+def check_genome(sKey,dicGenomes,setGenes,sEntryType):
+    '''checks if the genome of a file (sKey is the real path) in dicGenomes can be used for setGenes.
+    Returns if the file needs to be read, and the genes to read it for
+    '''
+    if sKey in dicGenomes:
+        #a file which was only read up to some genes (an earlier job of a batch) has to be read again for other genes
+        cGenome = dicGenomes[sKey]
+        if cGenome.setGenes is None or not setGenes or (set(setGenes)<=cGenome.setGenes and cGenome.lEntryType==sEntryType):
+            return False,None
+        if cGenome.lEntryType==sEntryType:
+            setGenes = set(setGenes)|cGenome.setGenes
+    return True,setGenes
+
+def read_genbank_job(tJob):
+    '''reads one genbank file for --jobs in its own process, and builds the identifier index which the rows need.
+    Returns the genome, or the problem as text
+    '''
+    sIn,sCacheDir,setGenes,sEntryType,lRows = tJob
+    try:
+        cGenome = get_genbank(sIn,dict(),sCacheDir,setGenes,sEntryType)
+        for sStartGene,sStopGene in lRows:
+            try:
+                cGenome.find_contig(sStartGene,sStopGene,sEntryType)
+            except PlotError:
+                pass #reported later for the right row
+    except PlotError as e:
+        return sIn,None,str(e)
+    except Exception as e:
+        return sIn,None,repr(e)
+    return sIn,cGenome,""
+
+def read_genbank_parallel(lIn,lStartGene,lStopGene,sEntryType,dicGenomes,sCacheDir,dicGenes,iJobs):
+    '''--jobs: reads all genbank files which are not in dicGenomes yet at the same time, in iJobs processes.
+    The genomes end up in dicGenomes, so that the rows can then be done one after the other as usual.
+    A file which can't be read is reported with the first row which uses it
+    '''
+    dicRows = collections.OrderedDict()
+    for i,sIn in enumerate(lIn):
+        sKey = get_file_key(sIn)
+        if sKey=="-":continue #stdin can only be read by this process
+        if not sKey in dicRows:
+            dicRows[sKey] = (i,sIn,[])
+        dicRows[sKey][2].append((lStartGene[i],lStopGene[i]))
+    lJobs = []
+    for sKey,(i,sIn,lRows) in dicRows.items():
+        bRead,setGenes = check_genome(sKey,dicGenomes,dicGenes[sKey],sEntryType)
+        if bRead:
+            lJobs.append((sIn,sCacheDir,setGenes,sEntryType,lRows))
+    #a process of a --batch pool can't start processes itself, then the files are just read one after the other later
+    if len(lJobs)<2 or multiprocessing.current_process().daemon:
+        return
+    pool = multiprocessing.Pool(min(iJobs,len(lJobs)))
+    try:
+        lResults = pool.map(read_genbank_job,lJobs)
+    finally:
+        pool.close()
+        pool.join()
+    for sIn,cGenome,sError in lResults:
+        sKey = get_file_key(sIn)
+        if cGenome is None:
+            raise PlotError("row "+str(dicRows[sKey][0]+1)+" ("+sIn+"): "+sError)
+        dicGenomes[sKey] = cGenome
+
+def get_genbank(sFile,dicGenomes,sCacheDir="",setGenes=None,sEntryType=None):
+    '''returns the parsed genbank file as genome object. Each file is only read once per run, the result is kept in dicGenomes,
+    so that rows which use the same file (and the scale calculation) don't parse it again.
+    With a cache directory, the parsed file is also kept on disk for the next runs, and is therefore read completely.
+    Otherwise setGenes should be all start and stop genes of this file, then the file is only read up to them
+    '''
+    sKey = get_file_key(sFile)
+    if sFile=="-":
+        #stdin can only be read once, so completely, and there is nothing to compare a cache file with
+        setGenes = None
+        sCacheDir = ""
+    bRead,setGenes = check_genome(sKey,dicGenomes,setGenes,sEntryType)
+    if not bRead:
+        return dicGenomes[sKey]
+    if is_gff(sFile):
+        #the cache directory holds the index of the file, see read_gff
+        dicGenomes[sKey] = read_gff(sFile,setGenes,sEntryType,sCacheDir)
+        return dicGenomes[sKey]
+    setWanted = setGenes
+    if setGenes:
+        #coordinate rows (see get_wanted_genes) need the whole genbank file, otherwise only the identifiers count
+        if any(isinstance(wanted,tuple) and wanted[0]!="genes" for wanted in setGenes):
+            setGenes = None
+        else:
+            setGenes = set(wanted for wanted in setGenes if not isinstance(wanted,tuple))
+    if sCacheDir:
+        dicGenomes[sKey] = read_genbank_cached(sFile,sCacheDir)
+    else:
+        dicGenomes[sKey] = read_genbank(sFile,setGenes,sEntryType)
+        if setGenes:
+            dicGenomes[sKey].setGenes = set(setWanted)
+    return dicGenomes[sKey]
 
 def get_label(sLabel,item,dicNames):
     '''creates the final output string. If anything is specified in the name file, it will be used.
@@ -255,11 +1615,44 @@ def get_label(sLabel,item,dicNames):
         return item.sLocus+" "+item.sProduct
     return item.sLocus#+" "+item.sProduct
 
-def make_plot(lEntry,sRev,iScale,sLabel,sLabelPos,iRotation,sEntryType,sStartGene,sStopGene,sOut,sExt,iStartCoord,iStopCoord,iDistOffset,iSizeText,dicNames,sOrgName,ax,bCoord,fThick):
-    '''plots each entry in the input file
-    I should consider splitting up this function, it is a bit long and complicated
+def get_points_to_data(ax):
+    '''how many data units one point (1/72 inch) is in x and y. Needs the final position and limits of the axes
+    '''
+    fig = ax.get_figure()
+    cPos = ax.get_position()
+    fXmin,fXmax = ax.get_xlim()
+    fYmin,fYmax = ax.get_ylim()
+    return (fXmax-fXmin)/(cPos.width*fig.get_figwidth()*72),(fYmax-fYmin)/(cPos.height*fig.get_figheight()*72)
+
+def get_arrow_polygons(cWindow,fThickFin,fXPerPoint,fYPerPoint):
+    '''the outlines of all arrows of a window in data coordinates, as array of shape (entries,5,2).
+    This is the shape a FancyArrowPatch with the "simple" arrow style and mutation_scale 100 has: both ends shrunk by 2 points,
+    a head of 10 points, head and tail fThickFin*100 points wide. Arrows shorter than the head are only the head
     '''
     
+    aFrom = np.where(cWindow.aCompl,cWindow.aStop,cWindow.aStart).astype(float)
+    aTo = np.where(cWindow.aCompl,cWindow.aStart,cWindow.aStop).astype(float)
+    aDir = np.where(aTo>=aFrom,1.0,-1.0)
+    aFrom = aFrom+aDir*2*fXPerPoint
+    aTo = aTo-aDir*2*fXPerPoint
+    #features which are shorter than the shrinking end up as a single point
+    aMiddle = (aFrom+aTo)/2
+    aTooShort = (aTo-aFrom)*aDir<0
+    aFrom = np.where(aTooShort,aMiddle,aFrom)
+    aTo = np.where(aTooShort,aMiddle,aTo)
+    aHead = aTo-aDir*10*fXPerPoint
+    aTail = np.where((aTo-aFrom)*aDir>10*fXPerPoint,aFrom,aHead)
+    fHalf = fThickFin*50*fYPerPoint
+    aPolygons = np.empty((len(cWindow),5,2))
+    aPolygons[:,:,0] = np.stack([aTail,aHead,aTo,aHead,aTail],axis=1)
+    aPolygons[:,:,1] = [-fHalf,-fHalf,0,fHalf,fHalf]
+    return aPolygons
+
+def plot_frame(sRev,iScale,iStartCoord,iStopCoord,iSizeText,sOrgName,bCoord):
+    '''everything of a row except the entries: x range, the line, coordinates and organism name
+    '''
+    import matplotlib.pyplot as plt
+    
     iStopCoordOrg = iStopCoord
     iStopCoord = iStartCoord+iScale
     plt.xlim(iStartCoord-200,iStopCoord+200)
@@ -281,89 +1674,235 @@ def make_plot(lEntry,sRev,iScale,sLabel,sLabelPos,iRotation,sEntryType,sStartGen
     plt.axhline(0,color="black",linewidth=2,xmax=iEndH)        
     plt.ylim(-0.1,0.1)
     plt.axis('off')
-    fThickFin = 0.3 * fThick
 
-    #arrow_style="simple,head_length=0.1,head_width=0.3,tail_width=0.3"
-    arrow_style="simple,head_length=0.1,head_width="+str(fThickFin)+",tail_width="+str(fThickFin)
-    bPrint = False
-    for item in lEntry:
-        if (item.sLocus ==sStartGene or item.sGeneName==sStartGene or item.sProduct==sStartGene or item.sOldLocus==sStartGene or item.sProtein==sStartGene)  and (item.sType in sEntryType or not sEntryType):
-            bPrint = True
-        if bPrint and (item.sType in sEntryType or not sEntryType):
-            if item.bCompl:
-                iStartPrint = item.iStop
-                iStopPrint = item.iStart
-            else:
-                iStartPrint = item.iStart
-                iStopPrint = item.iStop
-            arrow = mpatches.FancyArrowPatch((iStartPrint, 0), (iStopPrint, 0),mutation_scale=100,facecolor=item.sColour,arrowstyle=arrow_style)
-            #arrow = mpatches.FancyArrowPatch((iStartPrint, 0), (iStartPrint+(iLen*9), 0),mutation_scale=100,facecolor=item.sColour,arrowstyle=arrow_style)
-            ax.add_patch(arrow)
-            arrowcoords = arrow.get_patch_transform().transform(arrow.get_path().vertices[:-1])
-            iLength = max(item.iStop,item.iStart)-min(item.iStop,item.iStart)
-            iMiddle = min(item.iStart,item.iStop)+iLength/2
-            iY = 0.02
-            if sLabelPos=="Down":iY = iY*-1
-            iY = iY+iDistOffset
-            sLabelOut = get_label(sLabel,item,dicNames)
-            if not iRotation:
-                custAlign="center"
-            else:
-                custAlign="left"
-            plt.annotate(sLabelOut,(iMiddle,iY),rotation=iRotation,fontsize=iSizeText,horizontalalignment=custAlign)            
-            if item.lIntrons:                
-                for introns in item.lIntrons:                    
-                    if introns[1]-introns[0]<=0:continue #can't draw introns of negative size
-                    #I do not know why the hell the Y coords + size do not scale, and why if I just plot it at the -Y of the arrow it does not match
-                    #I really just don't know, it should, right?
-                    #this right now works fine for up to 10 genomes, although not perfect. Good enough
-                    rec = mpatches.Rectangle((introns[0],-1.2*abs(arrowcoords[0][1])),width=introns[1]-introns[0],height=arrowcoords[0][1]*2.4,color="#A9A9A9")
-                    ax.add_patch(rec)
-
-        if (item.sLocus ==sStopGene or item.sGeneName==sStopGene or item.sProduct==sStopGene or item.sProtein==sStopGene or item.sOldLocus==sStopGene)  and (item.sType in sEntryType or not sEntryType):
-            bPrint = False
-            break
+def draw_arrows(ax,cWindow,lItems,fThickFin,cColours):
+    '''all arrows and all introns are computed at once in data coordinates, and drawn as one collection each
+    '''
+    from matplotlib.collections import PolyCollection
+    
+    fXPerPoint,fYPerPoint = get_points_to_data(ax)
+    aPolygons = get_arrow_polygons(cWindow,fThickFin,fXPerPoint,fYPerPoint)
+    lColours = [cColours.get_colour(item) for item in lItems]
+    ax.add_collection(PolyCollection(aPolygons,facecolors=lColours,edgecolors="black",linewidths=1,joinstyle="round"),autolim=False)
+    aIntrons = cWindow.get_introns()
+    aIntrons = aIntrons[aIntrons[:,1]-aIntrons[:,0]>0] #can't draw introns of negative size
+    if len(aIntrons):
+        #the introns are a bit narrower than the arrow, so that the outline of the arrow stays visible
+        fHalf = 0.864*fThickFin*50*fYPerPoint
+        aRects = np.empty((len(aIntrons),4,2))
+        aRects[:,:,0] = aIntrons[:,[0,1,1,0]]
+        aRects[:,:,1] = [-fHalf,-fHalf,fHalf,fHalf]
+        ax.add_collection(PolyCollection(aRects,facecolors="#A9A9A9",edgecolors="#A9A9A9",linewidths=1),autolim=False)
+
+def get_char_widths(iSizeText):
+    '''the width in points of the printable ascii characters in the default font, measured once per font size from the font
+    itself, without drawing anything. Unknown characters get the average width
+    '''
+    if not iSizeText in _dicCharWidths:
+        from matplotlib.font_manager import FontProperties
+        from matplotlib.textpath import TextToPath
+        
+        cProp = FontProperties(size=iSizeText)
+        cTextToPath = TextToPath()
+        dicWidths = dict((chr(i),cTextToPath.get_text_width_height_descent(chr(i),cProp,ismath=False)[0]) for i in range(32,127))
+        dicWidths[""] = sum(dicWidths.values())/len(dicWidths)
+        _dicCharWidths[iSizeText] = dicWidths
+    return _dicCharWidths[iSizeText]
+
+def estimate_text_size(sText,iSizeText):
+    '''width and height of a label in points, from get_char_widths. Kerning is left out, the italics of gene names
+    are counted like normal letters, which is close enough for placing labels
+    '''
+    dicWidths = get_char_widths(iSizeText)
+    sText = sText.replace('$\\it{','').replace('}$','')
+    return sum(dicWidths.get(sChar,dicWidths[""]) for sChar in sText),iSizeText*1.2
+
+def assign_label_rows(lExtents):
+    '''sweep-line over the labels from left to right (lExtents are their (left,right) x ranges), each label goes into the lowest row
+    which is free at its left end. Rows which become free are kept in a heap, so this is O(n log n) also for many labels.
+    Returns the row of each label, 0 is the row next to the arrows
+    '''
+    import heapq
+    
+    lRows = [0]*len(lExtents)
+    lBusy = [] #(right end,row) of the last label of each row
+    lFree = []
+    iRows = 0
+    for i in sorted(range(len(lExtents)),key=lambda i:lExtents[i][0]):
+        fLeft,fRight = lExtents[i]
+        while lBusy and lBusy[0][0]<fLeft:
+            heapq.heappush(lFree,heapq.heappop(lBusy)[1])
+        if lFree:
+            iRow = heapq.heappop(lFree)
+        else:
+            iRow = iRows
+            iRows += 1
+        lRows[i] = iRow
+        heapq.heappush(lBusy,(fRight,iRow))
+    return lRows
+
+def draw_labels(ax,lItems,sLabel,sLabelPos,iRotation,iDistOffset,iSizeText,dicNames,sLabelLayout="fixed"):
+    '''a label for each entry. With sLabelLayout "auto", labels which would overlap are put into rows above each other
+    (below for --label_location Down), see assign_label_rows. Their size is estimated, see estimate_text_size
+    '''
+    lLabels = []
+    for item in lItems:
+        iLength = max(item.iStop,item.iStart)-min(item.iStop,item.iStart)
+        iMiddle = min(item.iStart,item.iStop)+iLength/2
+        lLabels.append((iMiddle,get_label(sLabel,item,dicNames)))
+    iY = 0.02
+    if sLabelPos=="Down":iY = iY*-1
+    iY = iY+iDistOffset
+    if not iRotation:
+        custAlign="center"
+    else:
+        custAlign="left"
+    if sLabelLayout!="auto":
+        for iMiddle,sLabelOut in lLabels:
+            ax.annotate(sLabelOut,(iMiddle,iY),rotation=iRotation,fontsize=iSizeText,horizontalalignment=custAlign)
+        return
+    fXPerPoint,fYPerPoint = get_points_to_data(ax)
+    fSin = abs(np.sin(np.radians(iRotation)))
+    fCos = abs(np.cos(np.radians(iRotation)))
+    lExtents = []
+    fRowHeight = 0
+    for iMiddle,sLabelOut in lLabels:
+        fWidth,fHeight = estimate_text_size(sLabelOut,iSizeText)
+        #the box around the rotated text, plus a small gap
+        fBoxWidth = (fWidth*fCos+fHeight*fSin+iSizeText*0.3)*fXPerPoint
+        fRowHeight = max(fRowHeight,fWidth*fSin+fHeight*fCos)
+        if custAlign=="center":
+            lExtents.append((iMiddle-fBoxWidth/2,iMiddle+fBoxWidth/2))
+        else:
+            lExtents.append((iMiddle,iMiddle+fBoxWidth))
+    if sLabelPos=="Down":fRowHeight = -fRowHeight
+    for (iMiddle,sLabelOut),iRow in zip(lLabels,assign_label_rows(lExtents)):
+        #rows can reach out of the axes, they are drawn anyway
+        ax.annotate(sLabelOut,(iMiddle,iY+iRow*fRowHeight*fYPerPoint),rotation=iRotation,fontsize=iSizeText,horizontalalignment=custAlign,annotation_clip=False)
+
+def draw_overview(ax,cWindow,fThickFin,cColours):
+    '''draws the entries of a window which is too big for arrows and labels. The x axis is cut into pixel sized buckets.
+    If there are at most 4 pixels per entry, each entry is a block in its colour, at least one pixel wide, entries which point
+    to the right above the line and the others below. Otherwise the number of entries in each bucket is drawn as density,
+    again to the right up and to the left down. Then the size of the plot does not depend on the number of entries
+    '''
+    from matplotlib.collections import PolyCollection
+    
+    fig = ax.get_figure()
+    iBins = max(1,int(round(ax.get_position().width*fig.get_figwidth()*fig.dpi)))
+    fXmin,fXmax = ax.get_xlim()
+    fBinSize = (fXmax-fXmin)/iBins
+    fXPerPoint,fYPerPoint = get_points_to_data(ax)
+    fHalf = fThickFin*50*fYPerPoint
+    aFrom = np.where(cWindow.aCompl,cWindow.aStop,cWindow.aStart)
+    aTo = np.where(cWindow.aCompl,cWindow.aStart,cWindow.aStop)
+    aRight = aTo>=aFrom
+    aLeft = np.minimum(aFrom,aTo).astype(float)
+    aEnd = np.maximum(np.maximum(aFrom,aTo),aLeft+fBinSize)
+    if len(cWindow)*4<=iBins:
+        lColours = [cColours.get_colour(cWindow.get(i)) for i in range(len(cWindow))]
+        aRects = np.empty((len(cWindow),4,2))
+        aRects[:,:,0] = np.stack([aLeft,aEnd,aEnd,aLeft],axis=1)
+        aY = np.where(aRight,fHalf,-fHalf)
+        aRects[:,:,1] = np.stack([np.zeros(len(aY)),np.zeros(len(aY)),aY,aY],axis=1)
+        ax.add_collection(PolyCollection(aRects,facecolors=lColours,edgecolors=lColours,linewidths=0),autolim=False)
+        return
+    aFirst = np.clip(((aLeft-fXmin)/fBinSize).astype(np.int64),0,iBins-1)
+    aLast = np.clip(((aEnd-fXmin)/fBinSize).astype(np.int64),0,iBins-1)
+    lCounts = []
+    for aWanted in (aRight,~aRight):
+        #+1 where an entry starts, -1 behind where it ends, the running sum is then the number of entries in each bucket
+        aDiff = np.zeros(iBins+1,dtype=np.int64)
+        np.add.at(aDiff,aFirst[aWanted],1)
+        np.add.at(aDiff,aLast[aWanted]+1,-1)
+        lCounts.append(np.cumsum(aDiff)[:-1])
+    iMax = max(1,max(aCount.max() for aCount in lCounts))
+    aX = fXmin+np.arange(iBins+1)*fBinSize
+    for aCount,iSign in zip(lCounts,(1,-1)):
+        aY = iSign*2*fHalf*aCount/iMax
+        ax.fill_between(aX,np.append(aY,aY[-1]),0,step="post",color="#696969",linewidth=0)
+
+def make_plot(cWindow,sRev,iScale,sLabel,sLabelPos,iRotation,sEntryType,sStartGene,sStopGene,sOut,sExt,iStartCoord,iStopCoord,iDistOffset,iSizeText,dicNames,sOrgName,ax,bCoord,fThick,cColours,sLabelLayout="fixed"):
+    '''plots each entry in cWindow, which should only be the entries between start and stop gene (see get_window)
+    Colours (see colour_rules) and labels are only looked up here, for the entries which are actually plotted
+    '''
+    plot_frame(sRev,iScale,iStartCoord,iStopCoord,iSizeText,sOrgName,bCoord)
+    fThickFin = 0.3 * fThick
+    lItems = [cWindow.get(i) for i in range(len(cWindow))]
+    draw_arrows(ax,cWindow,lItems,fThickFin,cColours)
+    draw_labels(ax,lItems,sLabel,sLabelPos,iRotation,iDistOffset,iSizeText,dicNames,sLabelLayout)
+    return True
 
+def make_overview(cWindow,sRev,iScale,iStartCoord,iStopCoord,iSizeText,sOrgName,ax,bCoord,fThick,cColours,**dicLabels):
+    '''--overview: like make_plot, but the entries are drawn with draw_overview. There are no labels,
+    so the label options in dicLabels are not used
+    '''
+    plot_frame(sRev,iScale,iStartCoord,iStopCoord,iSizeText,sOrgName,bCoord)
+    draw_overview(ax,cWindow,0.3*fThick,cColours)
     return True
 
-def get_start_stop_coords(lEntry,sStartGene,sStopGene,sEntryType):
-    iStartCoord = 0
-    iStopCoord = 0
-    bStart = False
-    bStop = False
-    #note: last check for not bStart/bStop is in case there are multiple features with the same identifier, with different start/stop coordinates.
-    #in this case only the first one should be taken.
+def build_index(cTable,sEntryType):
+    '''maps each identifier (locus tag, gene name, product, old locus tag, protein id) to the position of the
+    first entry in the feature table which has it. Only entries of the wanted types are used.
+    This way start and stop genes don't need to be searched in the whole list again for every row
+    '''
+    
+    dicIndex = dict()
+    aRows = np.flatnonzero(cTable.type_mask(sEntryType))
+    for sCol in cTable.lIdColumns:
+        aCodes,aFirst = np.unique(cTable.dicIds[sCol][aRows],return_index=True)
+        for iCode,iPos in zip(aCodes.tolist(),aRows[aFirst].tolist()):
+            if not iCode:continue #empty identifier
+            sId = cTable.cStrings[iCode]
+            if not sId in dicIndex or dicIndex[sId]>iPos:
+                dicIndex[sId] = iPos
+    return dicIndex
+
+def get_start_stop_coords(cTable,sStartGene,sStopGene,sEntryType,dicIndex=None):
+    #note: the index only keeps the first entry for each identifier, in case there are multiple features with the same identifier, with different start/stop coordinates.
     #why this matters: signal peptide with locus tag same as the gene on the rev. complement led to an improper determination of the stop coordinate.
     #this might still cause issues, I think, since we can't assume that the longest item is first in the genbank file.
     #I could re-sort the list, based on start position and length...mmhhh....
-    for item in lEntry:
-        if (item.sLocus ==sStartGene or item.sGeneName==sStartGene or item.sProduct==sStartGene or item.sProtein==sStartGene or item.sOldLocus==sStartGene) and item.sType in sEntryType and not bStart:
-            iStartCoord = item.iStart
-            bStart = True
-        if (item.sLocus ==sStopGene or item.sGeneName==sStopGene or item.sProduct==sStopGene or item.sProtein==sStopGene or item.sOldLocus==sStopGene) and item.sType in sEntryType and not bStop:
-            iStopCoord = item.iStop
-            bStop = True
-        '''if item.sLocus=="CD630_26050":
-            print ("found it")
-            print (item.sLocus,sStopGene)
-            print (item.sType,bStop)  '''          
-    if (not bStart):
-        print ("problem finding ",sStartGene)
-        print ("exiting")
-        exit(1)
-    elif (not bStart):
-        print ("problem finding ",sStopGene)
-        print ("exiting")
-        exit(1)        
+    if dicIndex is None:
+        dicIndex = build_index(cTable,sEntryType)
+    if not sStartGene in dicIndex:
+        raise PlotError("problem finding "+sStartGene)
+    elif not sStopGene in dicIndex:
+        raise PlotError("problem finding "+sStopGene)
     else:
-        return (iStartCoord,iStopCoord)
+        return (int(cTable.aStart[dicIndex[sStartGene]]),int(cTable.aStop[dicIndex[sStopGene]]))
+
+def get_window(cTable,iStartCoord,iStopCoord,cIntervals):
+    '''returns the entries which should be plotted: all entries of the wanted types (see interval_index) which are within
+    the range, sorted by their position, independent of the order in the file. If the stop comes before the start, nothing is plotted.
+    The window is a new, small feature table, so that reversing it does not touch the parsed genome
+    '''
+    return cTable.take(cIntervals.inside(iStartCoord,iStopCoord))
+
+def parse_range(sStartGene,sStopGene):
+    '''the start and stop of an input row can also be coordinates instead of identifiers:
+    contig:start-end with - as stop gene (contig: can be left out for the first contig), or a gene with +N, +Nkb or +Nmb
+    as stop gene for the gene and N bp/kb/mb on both sides. Returns ("range",contig,start,end), ("around",gene,bp),
+    or None for two identifiers
+    '''
+    
+    if sStopGene=="-":
+        cMatch = re.match(r"^(?:(.*):)?([0-9]+)-([0-9]+)$",sStartGene)
+        if not cMatch:
+            raise PlotError(sStartGene+" is not a range, it should look like contig:start-end")
+        return ("range",cMatch.group(1) or "",int(cMatch.group(2)),int(cMatch.group(3)))
+    cMatch = re.match(r"^\+([0-9]+(?:\.[0-9]+)?)(bp|kb|mb)?$",sStopGene,re.I)
+    if cMatch:
+        dicUnit = {"bp":1,"kb":1000,"mb":1000000}
+        return ("around",sStartGene,int(float(cMatch.group(1))*dicUnit[(cMatch.group(2) or "bp").lower()]))
+    return None
 
 def fill_dict(sFile):
     '''reads a random "csv" file, and parses the input
     into a dictionary. Used for reading the custom gene label and colour files
     '''
     
-    inputFile = open(sFile)
+    inputFile = open_text(sFile)
     curDic = dict()
     sSep = ""
     for lines in inputFile:
@@ -382,22 +1921,33 @@ def fill_dict(sFile):
         curDic.setdefault(lData[0],lData[1])
     return curDic
 
-def do_reverse(lEntry,iStartCoord,iStopCoord):
-    for item in lEntry:
-        item.iStart = iStopCoord-item.iStart+iStartCoord
-        item.iStop = iStopCoord-item.iStop+iStartCoord
-        if item.lIntrons:
-            for i,intron in enumerate(item.lIntrons):
-                #the logic for below is different than the logic for above, since here we don't care where start and stop is
-                #the coordinates just need to be adjusted for the reverse system, and don't actually need to be reversed
-                #there is a check for not plotting introns with negative length, so we want to have this incongruency
-                item.lIntrons[i]= [iStopCoord-intron[1]+iStartCoord,iStopCoord-intron[0]+iStartCoord]
-    return lEntry,iStartCoord,iStopCoord
+def do_reverse(cWindow,iStartCoord,iStopCoord):
+    '''returns a reversed copy of the window (see get_window), the window itself is not changed.
+    Everything is done on the whole arrays at once
+    '''
+    cRev = cWindow.take(np.arange(len(cWindow)))
+    iSum = iStopCoord+iStartCoord
+    cRev.aStart = iSum-cWindow.aStart
+    cRev.aStop = iSum-cWindow.aStop
+    #the exons are mirrored, and their order within each entry is reversed. The introns are the gaps between the exons,
+    #so an intron [a,b] becomes [iSum-b,iSum-a]. Here we don't care where start and stop is,
+    #the coordinates just need to be adjusted for the reverse system, and don't actually need to be reversed
+    #there is a check for not plotting introns with negative length, so we want to have this incongruency
+    aCounts = np.diff(cWindow.aExonOffset)
+    aReversed = np.repeat(cWindow.aExonOffset[:-1]+cWindow.aExonOffset[1:]-1,aCounts)-np.arange(cWindow.aExonOffset[-1])
+    cRev.aExons = iSum-cWindow.aExons[aReversed][:,::-1]
+    return cRev,iStartCoord,iStopCoord
 
 def sanitize_output_name(sOut,sIn,sExt,sStartGene,sStopGene):
     if not sExt.startswith("."):
         sExt = "."+sExt
     if not sOut:
+        if sIn=="-":
+            sIn = "stdin"
+        if parse_range(sStartGene,sStopGene):
+            #coordinate rows contain : and + which are not wanted in file names
+            sStartGene = re.sub(r"[^\w.-]","_",sStartGene)
+            sStopGene = re.sub(r"[^\w.-]","_",sStopGene)
         sOut = sIn+"."+sStartGene+"_"+sStopGene
     if sOut.endswith(sExt):
         sOut = sOut.rsplit(".",1)[0]
@@ -406,6 +1956,7 @@ def sanitize_output_name(sOut,sIn,sExt,sStartGene,sStopGene):
 def read_input_file(sFile):
     ''' reads the file with the genbank files,
     start and stop genes and if it is reverse or not
+    The file can be compressed, or "-" for stdin
     '''
     
     lIn = []
@@ -413,7 +1964,9 @@ def read_input_file(sFile):
     lStopGene = []
     lRev = []
     sSep = ""
-    inputFile = open(sFile)
+    if not is_input(sFile):
+        raise PlotError("could not find "+sFile)
+    inputFile = open_text(sFile)
     for lines in inputFile:
         lines = lines.strip()
         if not lines:continue
@@ -428,18 +1981,117 @@ def read_input_file(sFile):
             continue        
         lData  = lines.split(sSep)
         if len(lData)!=4:
-            print (lines+" in "+sFile+" is missing an entry, please fix")
-            exit(0)
-        sFile = lData[0].strip()
-        if not os.path.isfile(sFile):
-            print ("could not find "+sFile+", exiting")
-            exit(0)
-        lIn.append(sFile)
+            raise PlotError(lines+" in "+sFile+" is missing an entry, please fix")
+        sIn = lData[0].strip()
+        if not is_input(sIn):
+            raise PlotError("could not find "+sIn)
+        lIn.append(sIn)
         lStartGene.append(lData[1].strip())
         lStopGene.append(lData[2].strip())
         lRev.append(lData[3].strip())
     return lIn,lStartGene,lStopGene,lRev
 
+def write_profile(cTimer,profiler,sFile):
+    '''--profile: writes the timings of each step as json, and the cProfile statistics (can be read with pstats or e.g. snakeviz),
+    next to the file from write_args
+    '''
+    
+    dicReport = cTimer.get_report()
+    outputFile = open(sFile+".profile.json","w")
+    json.dump(dicReport,outputFile,indent=1)
+    outputFile.write("\n")
+    outputFile.close()
+    if profiler:
+        profiler.dump_stats(sFile+".profile.prof")
+    print ("time per step: "+", ".join(sPhase+" "+str(round(fTime,3))+" s" for sPhase,fTime in dicReport["phases"].items()))
+    print ("profile written to "+sFile+".profile.json")
+
+#options which don't change the plot, they are ignored when checking if a plot needs to be made again
+lNoOutputOptions = ["force","profile","jobs","processes","cache_dir","batch","serve","host","port","cache_features","check_only","version"]
+
+def get_input_files(args,lIn):
+    '''all files the plot depends on: genbank files, input file, colour, rules and name file
+    '''
+    lFiles = []
+    for sFile in list(lIn)+[args.input_file,args.color_file,args.rules_file,args.name_file]:
+        if sFile and not sFile in lFiles:
+            lFiles.append(sFile)
+    return lFiles
+
+def get_args_hash(args):
+    dicArgs = dict((sKey,value) for sKey,value in vars(args).items() if not sKey in lNoOutputOptions)
+    return hashlib.sha1(json.dumps(dicArgs,sort_keys=True,default=str).encode("utf-8")).hexdigest()
+
+def read_input_hashes(sFile):
+    '''reads the file from write_input_hashes, returns the version, the hash of the args,
+    and for each input file (real path) size, modification time and content hash
+    '''
+    
+    sVersion = ""
+    sArgs = ""
+    dicFiles = dict()
+    sIn = sFile+".last_input_hashes.txt"
+    if not os.path.isfile(sIn):
+        return sVersion,sArgs,dicFiles
+    inputFile = open(sIn)
+    for lines in inputFile:
+        lData = lines.rstrip("\n").split("\t")
+        if lData[0]=="version" and len(lData)==2:
+            sVersion = lData[1]
+        elif lData[0]=="args" and len(lData)==2:
+            sArgs = lData[1]
+        elif lData[0]=="file" and len(lData)==5:
+            dicFiles[lData[1]] = (int(lData[2]),int(lData[3]),lData[4])
+    inputFile.close()
+    return sVersion,sArgs,dicFiles
+
+def get_input_hashes(lFiles,dicOld):
+    '''size, modification time and content hash of each input file. If size and time are the same as in dicOld,
+    the old hash is used, so that unchanged genbank files don't need to be read again
+    '''
+    
+    dicFiles = dict()
+    for sFile in lFiles:
+        sPath = os.path.realpath(sFile)
+        cStat = os.stat(sPath)
+        tOld = dicOld.get(sPath)
+        if tOld and tOld[0]==cStat.st_size and tOld[1]==cStat.st_mtime_ns:
+            dicFiles[sPath] = tOld
+        else:
+            dicFiles[sPath] = (cStat.st_size,cStat.st_mtime_ns,hash_file(sPath))
+    return dicFiles
+
+def is_up_to_date(args,lIn,sOut,sExt):
+    '''True if the output exists, and was made by this version with the same options from input files with the same content,
+    see write_input_hashes. Plots from stdin are always made again
+    '''
+    
+    lFiles = get_input_files(args,lIn)
+    if "-" in lFiles or not os.path.isfile(sOut+sExt):
+        return False
+    sVersion,sArgs,dicOld = read_input_hashes(sOut)
+    if sVersion!=VERSION or sArgs!=get_args_hash(args):
+        return False
+    dicFiles = get_input_hashes(lFiles,dicOld)
+    return all(sPath in dicOld and dicOld[sPath][2]==tFile[2] for sPath,tFile in dicFiles.items())
+
+def write_input_hashes(args,lIn,sFile):
+    '''writes the content hashes of all input files and a hash of the options next to the file from write_args,
+    so that the next run can skip the plot if nothing changed (see is_up_to_date)
+    '''
+    
+    lFiles = get_input_files(args,lIn)
+    if "-" in lFiles:
+        return
+    sVersion,sArgs,dicOld = read_input_hashes(sFile)
+    dicFiles = get_input_hashes(lFiles,dicOld)
+    outputFile = open(sFile+".last_input_hashes.txt","w")
+    outputFile.write("version\t"+VERSION+"\n")
+    outputFile.write("args\t"+get_args_hash(args)+"\n")
+    for sPath,(iSize,iTime,sHash) in dicFiles.items():
+        outputFile.write("file\t"+sPath+"\t"+str(iSize)+"\t"+str(iTime)+"\t"+sHash+"\n")
+    outputFile.close()
+
 def write_args(args,sFile):
     '''writes the args to a log file.
     Just in case the user wants to re-produce a plot with similar parameters.
@@ -461,15 +2113,18 @@ def assign_parameters(args):
     lRev = []    
     if args.input:
         for lists in args.input:
-            if not os.path.isfile(lists[0]):
-                print ("could not find "+lists[0]+", exiting")
-                exit(0)
+            if not is_input(lists[0]):
+                raise PlotError("could not find "+lists[0])
             lIn.append(lists[0])
             lStartGene.append(lists[1])
             lStopGene.append(lists[2])
             lRev.append(lists[3])
     elif args.input_file:
         lIn,lStartGene,lStopGene,lRev = read_input_file(args.input_file)
+    if not lIn:
+        raise PlotError("no genbank files given, nothing to plot")
+    if args.input_file=="-" and "-" in lIn:
+        raise PlotError("stdin can only be used for either the input file or a genbank file")
 
     sEntryType = args.entry_type
     sLabel = args.label
@@ -484,65 +2139,703 @@ def assign_parameters(args):
     iSizeText = args.font_size
     bCoord = args.deactivate_coordinates
     fThick = args.arrow_thickness
+    sCacheDir = args.cache_dir
+    sRulesFile = args.rules_file
     sOut,sExt = sanitize_output_name(sOut,lIn[0],sExt,lStartGene[0],lStopGene[0])
 
-    return lIn,lStartGene,lStopGene,lRev,sEntryType,sLabel,sLabelPos,sOut,sColorFile,sNameFile,iScale,iRotation,sOut,sExt,iDistOffset,iSizeText,bCoord,fThick
+    return lIn,lStartGene,lStopGene,lRev,sEntryType,sLabel,sLabelPos,sOut,sColorFile,sNameFile,iScale,iRotation,sOut,sExt,iDistOffset,iSizeText,bCoord,fThick,sCacheDir,sRulesFile
+
+def get_dict(sFile,dicDicts):
+    '''fill_dict, but every colour/name file is only read once, the results are kept in dicDicts
+    '''
+    sKey = os.path.realpath(sFile)
+    if not sKey in dicDicts:
+        dicDicts[sKey] = fill_dict(sFile)
+    return dicDicts[sKey]
+
+def get_colour_rules(sColorFile,sRulesFile,dicShared):
+    '''the colouring scheme from colour file and rules file (both can be empty), see colour_rules.
+    Like the files, it is only made once, so that the remembered colours are re-used by later jobs of a batch
+    '''
+    tKey = (os.path.realpath(sColorFile) if sColorFile else "",os.path.realpath(sRulesFile) if sRulesFile else "")
+    if not tKey in dicShared["colours"]:
+        dicColor = dict()
+        lRules = DEFAULT_COLOUR_RULES
+        if sColorFile:
+            dicColor = get_dict(sColorFile,dicShared["dicts"])
+        if sRulesFile:
+            if not os.path.isfile(sRulesFile):
+                raise PlotError("could not find "+sRulesFile)
+            lRules = list(get_dict(sRulesFile,dicShared["dicts"]).items())
+        dicShared["colours"][tKey] = colour_rules(lRules,dicColor)
+    return dicShared["colours"][tKey]
+
+def get_wanted_genes(lIn,lStartGene,lStopGene):
+    '''all start and stop genes per genbank file, so that every file is read only once, also if it is used in several rows.
+    Each row is also added as tuple: ("genes",start gene,stop gene), or for coordinate rows what parse_range gives.
+    GFF3 files use these to read only the regions of the rows, genbank files with coordinate rows are read completely
+    '''
+    dicGenes = dict()
+    for i,sIn in enumerate(lIn):
+        setGenes = dicGenes.setdefault(get_file_key(sIn),set())
+        tRange = parse_range(lStartGene[i],lStopGene[i])
+        if tRange:
+            setGenes.add(tRange)
+        else:
+            setGenes.update([lStartGene[i],lStopGene[i],("genes",lStartGene[i],lStopGene[i])])
+    return dicGenes
 
-def do_processing(args):
+def get_complete_genbank(sFile,dicGenomes,sCacheDir=""):
+    '''get_genbank, but the file is read again if it was only read up to some genes before (by an earlier job of a batch)
+    '''
+    sKey = get_file_key(sFile)
+    if sKey in dicGenomes and not dicGenomes[sKey].setGenes is None:
+        del dicGenomes[sKey]
+    return get_genbank(sFile,dicGenomes,sCacheDir)
+
+def get_range_coords(cGenome,tRange,sEntryType):
+    '''contig and start/stop coordinates of a coordinate row, see parse_range. The range is extended to the ends of the entries
+    which reach into it, so that they are plotted completely
+    '''
+    if tRange[0]=="range":
+        sMode,sContig,iStart,iStop = tRange
+        if not sContig:
+            sContig = next(iter(cGenome.dicLength),next(iter(cGenome.dicContigs),""))
+        if not cGenome.has_contig(sContig):
+            raise PlotError("could not find contig "+sContig+", the file has "+", ".join(list(cGenome.dicLength)[:10]))
+        if iStart>iStop:
+            raise PlotError("the range "+str(iStart)+"-"+str(iStop)+" starts behind its end")
+        return sContig,cGenome.get_intervals(sContig,sEntryType).get_extent(iStart,iStop)
+    sMode,sGene,iFlank = tRange
+    sContig = cGenome.find_contig(sGene,sGene,sEntryType)
+    iStart,iStop = get_start_stop_coords(cGenome.get_table(sContig),sGene,sGene,sEntryType,cGenome.get_index(sContig,sEntryType))
+    iStart,iStop = min(iStart,iStop),max(iStart,iStop)
+    iStop = iStop+iFlank
+    if cGenome.get_length(sContig):
+        iStop = min(iStop,cGenome.get_length(sContig))
+    return sContig,cGenome.get_intervals(sContig,sEntryType).get_extent(max(1,iStart-iFlank),iStop)
+
+def resolve_row(sIn,sStartGene,sStopGene,sEntryType,dicGenomes,sCacheDir,dicGenes,cTimer=None):
+    '''reads the genbank file of a row (if not done yet), and returns the contig and the start/stop coordinates of the row
+    '''
+    cTimer = cTimer or phase_timer()
+    tRange = parse_range(sStartGene,sStopGene)
+    with cTimer.phase("read_genbank",sIn):
+        cGenome = get_genbank(sIn,dicGenomes,sCacheDir,dicGenes[get_file_key(sIn)],sEntryType)
+    with cTimer.phase("get_start_stop_coords",sIn):
+        if tRange:
+            sContig,tCoords = get_range_coords(cGenome,tRange,sEntryType)
+        else:
+            sContig = cGenome.find_contig(sStartGene,sStopGene,sEntryType)
+            tCoords = get_start_stop_coords(cGenome.get_table(sContig),sStartGene,sStopGene,sEntryType,cGenome.get_index(sContig,sEntryType))
+    dicFile = cTimer.dicFiles.setdefault(sIn,dict())
+    dicFile["features"] = cGenome.count_features()
+    dicFile["read_completely"] = cGenome.setGenes is None
+    return sContig,tCoords
+
+def get_scale(lCoords,iScale):
+    '''the size of the plots in bp: the given scale, or otherwise the longest stretch of all rows
+    '''
+    if not iScale:
+        for iStartCoord,iStopCoord in lCoords:
+            iDif = iStopCoord-iStartCoord
+            if iDif >iScale:
+                iScale = iDif
+    return iScale
+
+def do_check(args,outputFile,dicShared=None):
+    '''--check_only: does everything do_processing does up to the coordinates, but does not plot anything.
+    Writes a json report with contig and coordinates of each row and the resulting scale to outputFile,
+    so that pipelines can validate their input before rendering. Returns True if all rows are fine.
+    With dicShared (--batch), the genbank files are read completely and kept for the next jobs, like in build_figure
+    '''
+    
+    dicReport = {"version":VERSION,"ok":True,"error":"","scale":None,"rows":[]}
+    try:
+        lIn,lStartGene,lStopGene,lRev,sEntryType,sLabel,sLabelPos,sOut,sColorFile,sNameFile,iScale,iRotation,sOut,sExt,iDistOffset,iSizeText,bCoord,fThick,sCacheDir,sRulesFile = assign_parameters(args)
+    except PlotError as e:
+        dicReport["ok"] = False
+        dicReport["error"] = str(e)
+        lIn = []
+    dicGenomes = dict()
+    dicGenes = get_wanted_genes(lIn,lStartGene,lStopGene) if lIn else dict()
+    if dicShared is not None:
+        dicGenomes = dicShared["genomes"]
+        dicGenes = dict((sKey,None) for sKey in dicGenes)
+    lCoords = []
+    for i,sIn in enumerate(lIn):
+        dicRow = {"genbank_file":sIn,"start_gene":lStartGene[i],"stop_gene":lStopGene[i],"reverse":lRev[i],
+                  "contig":None,"start":None,"stop":None,"ok":True,"error":""}
+        try:
+            sContig,(iStartCoord,iStopCoord) = resolve_row(sIn,lStartGene[i],lStopGene[i],sEntryType,dicGenomes,sCacheDir,dicGenes)
+            dicRow.update({"contig":sContig,"start":iStartCoord,"stop":iStopCoord})
+            lCoords.append((iStartCoord,iStopCoord))
+        except PlotError as e:
+            dicRow.update({"ok":False,"error":str(e)})
+            dicReport["ok"] = False
+        dicReport["rows"].append(dicRow)
+    if lIn:
+        dicReport["scale"] = get_scale(lCoords,iScale)
+        dicReport["output"] = sOut+sExt
+    json.dump(dicReport,outputFile,indent=1)
+    outputFile.write("\n")
+    return dicReport["ok"]
+
+def do_processing(args,dicShared=None):
     '''starts the main processing
     Assigns the input variables, reads the input, sets the scale of the plot
     calls the plotting and saves the file    
+    dicShared can hold parsed genbank files and colour/name files from earlier jobs of a batch
+    With --profile, everything runs under cProfile, and the timings are written afterwards
+    '''
+    cTimer = phase_timer()
+    if not args.profile:
+        make_figure(args,dicShared,cTimer)
+        return
+    import cProfile
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        sOut = make_figure(args,dicShared,cTimer)
+    finally:
+        profiler.disable()
+    write_profile(cTimer,profiler,sOut)
+
+def plot_to_buffer(args,dicShared=None,outputFile=None):
+    '''makes the plot like do_processing, but writes it into a file object instead of the output file, e.g. for using
+    gene_plotter from other python code: plot_to_buffer(get_parser().parse_args([...])).getvalue() are the image bytes.
+    Without outputFile, a new io.BytesIO is used. A dicShared which is given for several calls keeps the genbank files
+    parsed (completely) between them. Returns the file object
+    '''
+    if outputFile is None:
+        outputFile = io.BytesIO()
+    make_figure(args,dicShared,phase_timer(),outputFile)
+    return outputFile
+
+def import_pyplot(sBackend):
+    '''imports pyplot with the given (non-interactive) backend. It is set before pyplot is imported,
+    so that matplotlib does not look for a display or GUI toolkit
+    '''
+    import matplotlib
+    try:
+        matplotlib.use(sBackend)
+        import matplotlib.pyplot as plt
+    except (ImportError,ValueError) as e:
+        raise PlotError("could not use the matplotlib backend "+sBackend+": "+str(e))
+    return plt
+
+def get_pil_kwargs(args,sExt):
+    '''settings for the png/jpg encoder (PIL) from --png_compression, --jpg_quality and --optimize.
+    Empty if none are given, then the defaults of matplotlib are used
     '''
+    dicPil = dict()
+    if sExt==".png" and not args.png_compression is None:
+        dicPil["compress_level"] = args.png_compression
+    if sExt==".jpg" and args.jpg_quality:
+        dicPil["quality"] = args.jpg_quality
+    if sExt in (".png",".jpg") and args.optimize:
+        dicPil["optimize"] = True
+    return dicPil
 
-    lIn,lStartGene,lStopGene,lRev,sEntryType,sLabel,sLabelPos,sOut,sColorFile,sNameFile,iScale,iRotation,sOut,sExt,iDistOffset,iSizeText,bCoord,fThick = assign_parameters(args)
-    write_args(args,sOut)
+def make_figure(args,dicShared,cTimer,outputFile=None):
+    '''the actual work of do_processing, returns the output name (without extension)
+    If outputFile (a file object, e.g. io.BytesIO) is given, the plot is written there instead of to the output file
+    --dpi only counts for this plot, the next job of a batch or request of --serve starts from the default again
+    '''
+    with cTimer.phase("import_matplotlib"):
+        plt = import_pyplot(args.backend)
+    with plt.rc_context({"figure.dpi":args.dpi} if args.dpi else None):
+        return build_figure(args,dicShared,cTimer,outputFile,plt)
+
+def build_figure(args,dicShared,cTimer,outputFile,plt):
+    lIn,lStartGene,lStopGene,lRev,sEntryType,sLabel,sLabelPos,sOut,sColorFile,sNameFile,iScale,iRotation,sOut,sExt,iDistOffset,iSizeText,bCoord,fThick,sCacheDir,sRulesFile = assign_parameters(args)
+    if outputFile is None:
+        if not args.force and is_up_to_date(args,lIn,sOut,sExt):
+            print (sOut+sExt+" is up to date, nothing changed since it was plotted (use --force to plot it anyway)")
+            return sOut
+        write_args(args,sOut)
 
-    dicColor = dict()
+    #genomes which are kept for later jobs (--batch, --serve) are read completely, a genome read only up to
+    #the genes of this plot would have to be read again for the next one with other genes
+    bKeepGenomes = dicShared is not None
+    if dicShared is None:
+        dicShared = {"genomes":dict(),"dicts":dict(),"colours":dict()}
+    cColours = get_colour_rules(sColorFile,sRulesFile,dicShared)
     dicNames = dict()
-    if sColorFile:
-        dicColor = fill_dict(sColorFile)
     if sNameFile:
-        dicNames = fill_dict(sNameFile)
+        dicNames = get_dict(sNameFile,dicShared["dicts"])
 
-    ###it's kinda inefficient to read all the genbanks here and further below
-    ###but the logic is simply easier like this
-    ###does not seem to have a considerable impact on performance, but did not test it
-    ###with big eukaryotic genomes
-    if not iScale:
-        for i,sIn in enumerate(lIn):
-            sStartGene = lStartGene[i]
-            sStopGene = lStopGene[i]
-            lEntry,sOrgName = read_genbank(sIn,dicColor)
-            iStartCoord,iStopCoord = get_start_stop_coords(lEntry,sStartGene,sStopGene,sEntryType)            
-            iDif = iStopCoord-iStartCoord
-            if iDif >iScale:
-                iScale = iDif            
+    #every genbank file is read only once, also if it is used in several rows
+    dicGenomes = dicShared["genomes"]
+    dicGenes = get_wanted_genes(lIn,lStartGene,lStopGene)
+    if args.pyramid or bKeepGenomes:
+        #the pyramid shows whole contigs, so the genbank files are read completely
+        dicGenes = dict((sKey,None) for sKey in dicGenes)
+    if args.jobs>1:
+        with cTimer.phase("read_genbank_parallel"):
+            read_genbank_parallel(lIn,lStartGene,lStopGene,sEntryType,dicGenomes,sCacheDir,dicGenes,args.jobs)
+    lCoords = []
+    lContigs = []
+    for i,sIn in enumerate(lIn):
+        try:
+            sContig,tCoords = resolve_row(sIn,lStartGene[i],lStopGene[i],sEntryType,dicGenomes,sCacheDir,dicGenes,cTimer)
+        except PlotError as e:
+            if len(lIn)==1:raise
+            raise PlotError("row "+str(i+1)+" ("+sIn+"): "+str(e))
+        lContigs.append(sContig)
+        lCoords.append(tCoords)
+    iScale = get_scale(lCoords,iScale)
     print ("longest stretch of DNA is: ",iScale)
-    fFactor = 0.00320 #empirical, tested... well, guessed, same as 2 lines below. Just seems to scale fine 
-    xLen = fFactor*iScale
+    xLen = fInchPerBp*iScale
+    #--overview: plots which would be wider than the given pixels are drawn at that width, with blocks or density instead of arrows
+    fDpi = plt.rcParams["figure.dpi"]
+    bOverview = bool(args.overview) and xLen*fDpi>args.overview
+    if bOverview:
+        print ("plot would be "+str(int(xLen*fDpi))+" pixels wide, drawing an overview of "+str(args.overview)+" pixels")
+        xLen = args.overview/fDpi
     yLen = (xLen/6)*len(lIn)
-    fig = plt.figure(figsize=(xLen,yLen))
+    #--max_width/--max_height: png and jpg get a lower dpi until they fit, everything is then smaller, but the layout stays the same
+    fMaxDpi = min([fDpi]+[iMax/fLen for iMax,fLen in ((args.max_width,xLen),(args.max_height,yLen)) if iMax])
+    if fMaxDpi<fDpi and sExt in (".png",".jpg") and not args.pyramid:
+        print ("lowering the dpi from "+str(fDpi)+" to "+str(round(fMaxDpi,2))+", to stay within the maximum size")
+        plt.rcParams["figure.dpi"] = fMaxDpi
+    dicPil = get_pil_kwargs(args,sExt)
 
+    #everything make_plot needs for each row, except the axes
+    lPlots = []
     for i,sIn in enumerate(lIn):
         sStartGene = lStartGene[i]
         sStopGene = lStopGene[i]
-        lEntry,sOrgName = read_genbank(sIn,dicColor)
-        iStartCoord,iStopCoord = get_start_stop_coords(lEntry,sStartGene,sStopGene,sEntryType)
+        cGenome = get_genbank(sIn,dicGenomes,sCacheDir)
+        iStartCoord,iStopCoord = lCoords[i]
+        with cTimer.phase("get_window",sIn):
+            cWindow = get_window(cGenome.get_table(lContigs[i]),iStartCoord,iStopCoord,cGenome.get_intervals(lContigs[i],sEntryType))
         if lRev[i]=="reverse":
-            lEntry,iStartCoord,iStopCoord = do_reverse(lEntry,iStartCoord,iStopCoord)
+            with cTimer.phase("do_reverse",sIn):
+                cWindow,iStartCoord,iStopCoord = do_reverse(cWindow,iStartCoord,iStopCoord)
+        lPlots.append({"cWindow":cWindow,"sRev":lRev[i],"iScale":iScale,"sLabel":sLabel,"sLabelPos":sLabelPos,"iRotation":iRotation,"sEntryType":sEntryType,
+                       "sStartGene":sStartGene,"sStopGene":sStopGene,"sOut":sOut,"sExt":sExt,"iStartCoord":iStartCoord,"iStopCoord":iStopCoord,
+                       "iDistOffset":iDistOffset,"iSizeText":iSizeText,"dicNames":dicNames,"sOrgName":cGenome.sName,"bCoord":bCoord,"fThick":fThick,"cColours":cColours,"sLabelLayout":args.label_layout})
+        cTimer.lRows.append({"genbank_file":sIn,"start_gene":sStartGene,"stop_gene":sStopGene,"contig":lContigs[i],"start":lCoords[i][0],"stop":lCoords[i][1],"plotted_features":len(cWindow)})
+
+    if args.pyramid:
+        make_pyramids(args,lIn,lContigs,dicGenomes,sCacheDir,sEntryType,lPlots,cTimer)
+        print (sOut+" pyramid written to "+args.pyramid)
+        return sOut
+    if args.tiles and not sExt in lTileExt:
+        print ("--tiles only works for "+", ".join(lTileExt)+", plotting everything at once")
+    elif args.tiles:
+        with cTimer.phase("render_tiles"):
+            lTiles = render_tiles(lPlots,xLen,yLen,sExt,args.jobs,bOverview)
+        with cTimer.phase("savefig"):
+            stitch_tiles(lTiles,sExt,yLen,sOut+sExt if outputFile is None else outputFile,dicPil)
+        if outputFile is None:
+            write_input_hashes(args,lIn,sOut)
+        print (sOut+" plotted succesfully")
+        return sOut
+
+    fig = plt.figure(figsize=(xLen,yLen))
+    #needs to be set before the plots are made, since the arrows are computed for the final size of the subplots
+    plt.subplots_adjust(wspace=0, hspace=0)
+    for i,dicPlot in enumerate(lPlots):
         plot = fig.add_subplot(len(lIn),1,1+i)
         ax= plt.gca()
-        make_plot(lEntry,lRev[i],iScale,sLabel,sLabelPos,iRotation,sEntryType, sStartGene,sStopGene,sOut,sExt,iStartCoord,iStopCoord,iDistOffset,iSizeText,dicNames,sOrgName,ax,bCoord,fThick)
-    plt.subplots_adjust(wspace=0, hspace=0)
-    plt.savefig(sOut+sExt)    
+        with cTimer.phase("make_plot",lIn[i]):
+            if bOverview:
+                make_overview(ax=ax,**dicPlot)
+            else:
+                make_plot(ax=ax,**dicPlot)
+    with cTimer.phase("savefig"):
+        dicSave = {"pil_kwargs":dicPil} if dicPil else dict()
+        if outputFile is None:
+            plt.savefig(sOut+sExt,**dicSave)
+        else:
+            plt.savefig(outputFile,format=sExt[1:],**dicSave)
     plt.cla()
     plt.close()
+    if outputFile is None:
+        write_input_hashes(args,lIn,sOut)
     print (sOut+" plotted succesfully")
+    return sOut
 
-if __name__ == "__main__":
+lTileExt = [".png",".jpg",".svg"]
+
+def render_tile(tJob):
+    '''--tiles: plots one row as its own figure. It is as wide as the whole plot, as high as one row of it,
+    and the axes are at the same horizontal position, so that the rows line up when the tiles are put below each other.
+    Returns the image as png or svg bytes
+    '''
+    import io
+    import matplotlib
+    import matplotlib.pyplot as plt
+    
+    dicPlot,xLen,fHeight,sFormat,bOverview = tJob
+    fLeft = matplotlib.rcParams["figure.subplot.left"]
+    fRight = matplotlib.rcParams["figure.subplot.right"]
+    fig = plt.figure(figsize=(xLen,fHeight))
+    ax = fig.add_axes([fLeft,0,fRight-fLeft,1])
+    if bOverview:
+        make_overview(ax=ax,**dicPlot)
+    else:
+        make_plot(ax=ax,**dicPlot)
+    outputFile = io.BytesIO()
+    #the tiles are only decoded again by stitch_tiles, so the png compression can be the fastest
+    fig.savefig(outputFile,format=sFormat,**({"pil_kwargs":{"compress_level":1}} if sFormat=="png" else dict()))
+    plt.close(fig)
+    return outputFile.getvalue()
+
+def render_tiles(lPlots,xLen,yLen,sExt,iJobs,bOverview=False):
+    '''renders all rows with render_tile, in iJobs processes. svg rows are svg tiles, everything else png tiles.
+    Each tile gets the height which the row has in the normal plot (without the margins above and below)
+    '''
+    import matplotlib
+    
+    fHeight = yLen*(matplotlib.rcParams["figure.subplot.top"]-matplotlib.rcParams["figure.subplot.bottom"])/len(lPlots)
+    lJobs = [(dicPlot,xLen,fHeight,"svg" if sExt==".svg" else "png",bOverview) for dicPlot in lPlots]
+    if iJobs<2 or len(lJobs)<2 or multiprocessing.current_process().daemon:
+        return [render_tile(tJob) for tJob in lJobs]
+    pool = multiprocessing.Pool(min(iJobs,len(lJobs)))
+    try:
+        return pool.map(render_tile,lJobs)
+    finally:
+        pool.close()
+        pool.join()
+
+def stitch_tiles(lTiles,sExt,yLen,output,dicPil=None):
+    '''puts the tiles from render_tiles below each other, with the same margins above and below as a normal plot, and saves
+    them to output (file name or file object). svg tiles are nested into one svg, png tiles are put together with PIL,
+    which is also used for jpg. dicPil are settings for the encoder, see get_pil_kwargs
+    '''
+    import io
+    import matplotlib
+    
+    fTop = 1-matplotlib.rcParams["figure.subplot.top"]
+    fBottom = matplotlib.rcParams["figure.subplot.bottom"]
+    if sExt==".svg":
+        #svg sizes are in points
+        fY = fTop*yLen*72
+        lParts = []
+        for i,bTile in enumerate(lTiles):
+            sTile = bTile.decode("utf-8")
+            sTile = sTile[sTile.index("<svg"):]
+            #matplotlib starts counting ids again in every tile, but they have to be unique in the whole file
+            sTile = re.sub(r'(\bid="|href="#|url\(#)',r'\g<1>tile'+str(i+1)+"_",sTile)
+            sHead = re.match(r"<svg[^>]*>",sTile).group(0)
+            fWidth,fHeight = [float(sValue) for sValue in re.search(r'viewBox="0 0 ([0-9.]+) ([0-9.]+)"',sHead).groups()]
+            lParts.append('<svg x="0" y="'+str(fY)+'" width="'+str(fWidth)+'" height="'+str(fHeight)+'" viewBox="0 0 '+str(fWidth)+" "+str(fHeight)+'">'+sTile[len(sHead):])
+            fY += fHeight
+        fY += fBottom*yLen*72
+        sSvg = ('<?xml version="1.0" encoding="utf-8" standalone="no"?>\n'
+                +'<svg xmlns:xlink="http://www.w3.org/1999/xlink" width="'+str(fWidth)+'pt" height="'+str(fY)+'pt" viewBox="0 0 '+str(fWidth)+" "+str(fY)+'" xmlns="http://www.w3.org/2000/svg" version="1.1">\n'
+                +'<rect width="100%" height="100%" fill="#ffffff"/>\n'+"\n".join(lParts)+"\n</svg>\n")
+        if isinstance(output,str):
+            with open(output,"w",encoding="utf-8") as outputFile:
+                outputFile.write(sSvg)
+        else:
+            output.write(sSvg.encode("utf-8"))
+        return
+    from PIL import Image
+    
+    fDpi = matplotlib.rcParams["figure.dpi"]
+    lImages = [Image.open(io.BytesIO(bTile)).convert("RGBA") for bTile in lTiles]
+    iTop = int(round(fTop*yLen*fDpi))
+    iHeight = iTop+sum(cImage.height for cImage in lImages)+int(round(fBottom*yLen*fDpi))
+    cOut = Image.new("RGBA",(lImages[0].width,iHeight),(255,255,255,255))
+    iY = iTop
+    for cImage in lImages:
+        cOut.paste(cImage,(0,iY))
+        iY += cImage.height
+    if sExt==".png":
+        cOut.save(output,format="PNG",dpi=(fDpi,fDpi),**(dicPil or dict()))
+    else:
+        cOut.convert("RGB").save(output,format="JPEG",dpi=(fDpi,fDpi),**(dicPil or dict()))
+
+def render_pyramid_tile(tJob):
+    '''--pyramid: one tile, which shows exactly the bp from iStart to iStop over its whole width, without margins,
+    coordinates or organism name. With bDetail the entries are arrows with labels, otherwise see draw_overview.
+    Returns the png bytes
+    '''
+    import io
+    import matplotlib.pyplot as plt
+    
+    cWindow,iStart,iStop,iWidth,bDetail,dicStyle = tJob
+    fDpi = plt.rcParams["figure.dpi"]
+    fig = plt.figure(figsize=(iWidth/fDpi,iWidth/4/fDpi))
+    ax = fig.add_axes([0,0,1,1])
+    ax.set_xlim(iStart,iStop)
+    ax.set_ylim(-0.1,0.1)
+    ax.axis('off')
+    ax.axhline(0,color="black",linewidth=2)
+    fThickFin = 0.3*dicStyle["fThick"]
+    if bDetail:
+        lItems = [cWindow.get(i) for i in range(len(cWindow))]
+        draw_arrows(ax,cWindow,lItems,fThickFin,dicStyle["cColours"])
+        draw_labels(ax,lItems,dicStyle["sLabel"],dicStyle["sLabelPos"],dicStyle["iRotation"],dicStyle["iDistOffset"],dicStyle["iSizeText"],dicStyle["dicNames"],dicStyle["sLabelLayout"])
+    else:
+        draw_overview(ax,cWindow,fThickFin,dicStyle["cColours"])
+    outputFile = io.BytesIO()
+    fig.savefig(outputFile,format="png",**({"pil_kwargs":dicStyle["dicPil"]} if dicStyle["dicPil"] else dict()))
+    plt.close(fig)
+    return outputFile.getvalue()
+
+def make_pyramid(cGenome,sContig,sDir,iWidth,iMaxLevel,sEntryType,dicStyle,pool):
+    '''--pyramid: writes a whole contig as png tiles of iWidth x iWidth/4 pixels to sDir/z/x.png. Level z has 2**z tiles side by side.
+    The last level is the first one where a tile has the resolution of a normal plot, there the entries are arrows with labels,
+    on the levels before see draw_overview. With iMaxLevel it stops earlier. pyramid.json describes the levels for a viewer.
+    Each tile only gets the entries which overlap it, see interval_index.
+    If pool is given, the tiles of a level are rendered in its processes
+    '''
+    import matplotlib
+    
+    iLength = cGenome.get_length(sContig)
+    if not iLength:
+        raise PlotError("contig "+sContig+" has no length and no entries, can't make a pyramid of it")
+    #a normal plot has fInchPerBp*dpi pixels per bp
+    fDetailBp = iWidth/(fInchPerBp*matplotlib.rcParams["figure.dpi"])
+    cTable = cGenome.get_table(sContig)
+    cIntervals = cGenome.get_intervals(sContig,sEntryType)
+    dicInfo = {"contig":sContig,"length":iLength,"tile_width":iWidth,"tile_height":iWidth//4,"levels":[]}
+    iLevel = 0
+    while True:
+        iTiles = 2**iLevel
+        iSpan = -(-iLength//iTiles)
+        bDetail = iSpan<=fDetailBp
+        lJobs = []
+        for x in range(iTiles):
+            iStart = x*iSpan
+            iStop = iStart+iSpan
+            lJobs.append((cTable.take(cIntervals.overlap(iStart,iStop)),iStart,iStop,iWidth,bDetail,dicStyle))
+        if pool is None:
+            lTiles = [render_pyramid_tile(tJob) for tJob in lJobs]
+        else:
+            lTiles = pool.map(render_pyramid_tile,lJobs)
+        sLevelDir = os.path.join(sDir,str(iLevel))
+        os.makedirs(sLevelDir,exist_ok=True)
+        for x,bTile in enumerate(lTiles):
+            with open(os.path.join(sLevelDir,str(x)+".png"),"wb") as outputFile:
+                outputFile.write(bTile)
+        dicInfo["levels"].append({"level":iLevel,"tiles":iTiles,"bp_per_tile":iSpan,"arrows":bDetail})
+        print ("pyramid of "+sContig+": level "+str(iLevel)+", "+str(iTiles)+" tiles of "+str(iSpan)+" bp")
+        if bDetail or iLevel==iMaxLevel:
+            break
+        iLevel += 1
+    with open(os.path.join(sDir,"pyramid.json"),"w") as outputFile:
+        json.dump(dicInfo,outputFile,indent=1)
+        outputFile.write("\n")
+
+def make_pyramids(args,lIn,lContigs,dicGenomes,sCacheDir,sEntryType,lPlots,cTimer):
+    '''--pyramid: a pyramid (see make_pyramid) for the contig of each row, in args.pyramid/contig.
+    A contig which is used by several rows gets only one. The style (labels, colours, thickness) is taken from the rows
+    '''
+    
+    pool = None
+    if args.jobs>1 and not multiprocessing.current_process().daemon:
+        pool = multiprocessing.Pool(args.jobs)
+    try:
+        setDone = set()
+        for i,sIn in enumerate(lIn):
+            sKey = get_file_key(sIn)
+            if (sKey,lContigs[i]) in setDone:continue
+            setDone.add((sKey,lContigs[i]))
+            cGenome = get_complete_genbank(sIn,dicGenomes,sCacheDir)
+            dicStyle = dict((sStyle,lPlots[i][sStyle]) for sStyle in ("sLabel","sLabelPos","iRotation","iDistOffset","iSizeText","dicNames","fThick","cColours","sLabelLayout"))
+            dicStyle["dicPil"] = get_pil_kwargs(args,".png")
+            sDir = os.path.join(args.pyramid,re.sub(r"[^\w.-]","_",lContigs[i]) or "contig")
+            with cTimer.phase("pyramid",sIn):
+                make_pyramid(cGenome,lContigs[i],sDir,args.pyramid_tile_width,args.pyramid_max_level,sEntryType,dicStyle,pool)
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+
+def run_job(tJob):
+    '''runs one plot of a batch. Problems are reported back instead of ending the whole batch.
+    With --check_only nothing is plotted, the message is then the json report of do_check
+    '''
+    
+    iLine,sLine,args = tJob
+    if args is None:
+        return (iLine,sLine,False,"could not understand the options")
+    if _dicBatchCache["genomes"] is None:
+        _dicBatchCache["genomes"] = genome_lru(args.cache_features)
+    try:
+        if not (args.input or args.input_file):
+            raise PlotError("no --input or --input_file given")
+        if args.check_only:
+            outputReport = io.StringIO()
+            bOk = do_check(args,outputReport,_dicBatchCache)
+            return (iLine,sLine,bOk,outputReport.getvalue())
+        do_processing(args,_dicBatchCache)
+    except Exception as e:
+        if "matplotlib.pyplot" in sys.modules:
+            sys.modules["matplotlib.pyplot"].close("all")
+        if isinstance(e,PlotError):
+            return (iLine,sLine,False,str(e))
+        return (iLine,sLine,False,repr(e))
+    return (iLine,sLine,True,"")
+
+def read_batch_file(sFile,args,parser):
+    '''reads the manifest for --batch. Each line is parsed like a command line, on top of the given args,
+    so that common options only need to be given once. Lines which can't be parsed get None as args, and fail later
+    '''
+    
+    if not os.path.isfile(sFile):
+        raise PlotError("could not find "+sFile)
+    lJobs = []
+    dicBase = vars(args).copy()
+    dicBase["input"] = None
+    dicBase["input_file"] = None
+    dicBase["batch"] = None
+    inputFile = open(sFile)
+    for i,lines in enumerate(inputFile):
+        lines = lines.strip()
+        if not lines:continue
+        if lines.startswith("#"):continue
+        try:
+            jobArgs = parser.parse_args(shlex.split(lines),namespace=argparse.Namespace(**dicBase))
+        except (SystemExit,ValueError):
+            jobArgs = None
+        lJobs.append((i+1,lines,jobArgs))
+    inputFile.close()
+    return lJobs
+
+def run_batch(args,parser,outputReport=None):
+    '''makes all plots from the --batch manifest, with --processes processes.
+    Parsed genbank files and colour/name files are re-used by all jobs which run in the same process.
+    With --check_only, the jobs are only checked (see do_check), and one json report with the reports
+    of all jobs is written to outputReport. Returns True if all jobs worked
+    '''
+    
+    lJobs = read_batch_file(args.batch,args,parser)
+    lReports = []
+    iFailed = 0
+    if args.processes>1:
+        pool = multiprocessing.Pool(args.processes)
+        iterResults = pool.imap(run_job,lJobs)
+    else:
+        pool = None
+        iterResults = map(run_job,lJobs)
+    for iLine,sLine,bOk,sMessage in iterResults:
+        if args.check_only:
+            #the report of do_check, or what went wrong before it
+            dicReport = json.loads(sMessage) if sMessage.startswith("{") else {"version":VERSION,"ok":False,"error":sMessage,"rows":[]}
+            dicReport.update({"line":iLine,"options":sLine})
+            lReports.append(dicReport)
+        if bOk:
+            print ("job in line "+str(iLine)+" done")
+        else:
+            iFailed += 1
+            print ("job in line "+str(iLine)+" failed"+("" if args.check_only else ": "+sMessage))
+    if pool:
+        pool.close()
+        pool.join()
+    if args.check_only:
+        json.dump({"version":VERSION,"ok":iFailed==0,"jobs":lReports},outputReport or sys.stdout,indent=1)
+        (outputReport or sys.stdout).write("\n")
+        print (str(len(lJobs)-iFailed)+" of "+str(len(lJobs))+" jobs checked succesfully")
+    else:
+        print (str(len(lJobs)-iFailed)+" of "+str(len(lJobs))+" jobs plotted succesfully")
+    return iFailed==0
+
+dicContentTypes = {".png":"image/png",".jpg":"image/jpeg",".svg":"image/svg+xml",".pdf":"application/pdf",".ps":"application/postscript",".eps":"application/postscript"}
+#options which make no sense for a single request of --serve, or which a client should not decide for the whole server:
+#where files are written (cache_dir), the matplotlib backend of the process, and process pools (jobs, tiles)
+lNoServeOptions = ["pyramid","batch","processes","serve","host","port","cache_features","check_only","profile","version",
+                   "cache_dir","backend","jobs","tiles","force"]
+
+def get_request_args(dicRequest,dicDefaults):
+    '''turns the json of a --serve request into args, as if the options were given on the command line.
+    Options which are not in the request get their default value
+    '''
+    
+    if not isinstance(dicRequest,dict):
+        raise PlotError("the request needs to be a json object")
+    dicArgs = dict(dicDefaults)
+    for sKey,value in dicRequest.items():
+        if not sKey in dicDefaults or sKey in lNoServeOptions:
+            raise PlotError("unknown option "+sKey)
+        dicArgs[sKey] = value
+    if dicArgs["input"]:
+        if not isinstance(dicArgs["input"],list) or not all(isinstance(lRow,list) and len(lRow)==4 for lRow in dicArgs["input"]):
+            raise PlotError("input needs to be a list of [genbank_file,start_gene,stop_gene,reverse]")
+    if not dicArgs["input"] and not dicArgs["input_file"]:
+        raise PlotError("no input or input_file given")
+    if not "."+str(dicArgs["file_extension"]).lstrip(".") in dicContentTypes:
+        raise PlotError("unknown file_extension "+str(dicArgs["file_extension"]))
+    return argparse.Namespace(**dicArgs)
+
+def serve(args):
+    '''--serve: keeps running, and makes plots for http requests. The genomes stay parsed between requests (see genome_lru),
+    so a request for a genome which was used before does not need to read it again.
+    POST a json object with the options (like on the command line, e.g. {"input":[["1.gbk","locus_tag_1","locus_tag_6","forward"]],"font_size":24})
+    to /plot, the answer is the image. Options which are not in the request are taken from the command line of the server.
+    GET /status gives the cached genomes
+    '''
+    import http.server
+    
+    plt = import_pyplot(args.backend)
+    
+    dicDefaults = vars(args).copy()
+    dicDefaults["input"] = None
+    dicDefaults["input_file"] = None
+    cGenomes = genome_lru(args.cache_features)
+
+    class plot_handler(http.server.BaseHTTPRequestHandler):
+        def send_answer(self,iStatus,bContent,sType):
+            self.send_response(iStatus)
+            self.send_header("Content-Type",sType)
+            self.send_header("Content-Length",str(len(bContent)))
+            self.end_headers()
+            self.wfile.write(bContent)
+
+        def send_json(self,iStatus,dicAnswer):
+            self.send_answer(iStatus,json.dumps(dicAnswer).encode("utf-8"),"application/json")
+
+        def do_GET(self):
+            if self.path.rstrip("/")!="/status":
+                self.send_json(404,{"error":"unknown path "+self.path})
+                return
+            self.send_json(200,{"version":VERSION,"genomes":list(cGenomes.dicGenomes),"features":cGenomes.iFeatures,"max_features":cGenomes.iMaxFeatures})
+
+        def do_POST(self):
+            if self.path.rstrip("/")!="/plot":
+                self.send_json(404,{"error":"unknown path "+self.path})
+                return
+            fStart = time.perf_counter()
+            try:
+                bRequest = self.rfile.read(int(self.headers.get("Content-Length",0)))
+                try:
+                    dicRequest = json.loads(bRequest.decode("utf-8"))
+                except ValueError:
+                    raise PlotError("could not read the json of the request")
+                requestArgs = get_request_args(dicRequest,dicDefaults)
+                #colour and name files are read again for every request, they are small and might have been changed
+                dicShared = {"genomes":cGenomes,"dicts":dict(),"colours":dict()}
+                outputFile = plot_to_buffer(requestArgs,dicShared)
+            except PlotError as e:
+                plt.close("all")
+                self.send_json(400,{"error":str(e)})
+                return
+            except Exception as e:
+                plt.close("all")
+                self.send_json(500,{"error":repr(e)})
+                return
+            self.send_answer(200,outputFile.getvalue(),dicContentTypes["."+requestArgs.file_extension.lstrip(".")])
+            print ("request done in "+str(round(time.perf_counter()-fStart,3))+" s")
+
+    #one request after the other, matplotlib can't plot in several threads at once
+    server = http.server.HTTPServer((args.host,args.port),plot_handler)
+    print ("serving on http://"+args.host+":"+str(server.server_address[1])+", POST plot requests as json to /plot")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+
+def get_parser():
     parser = argparse.ArgumentParser()
-    parser.add_argument("--input", action='append', nargs=4,metavar=('genbank_file','start_gene','stop_gene',"reverse"),help="Genbank file and start and stop gene and if it should be plotted forward or reverse. Can be used multiple times to plot multiple gbk files and/or gene ranges below each other. Used -input 1.gbk locus_tag_1 locus_tag_6 forward -input 2.gbk locus_tag_8 locus_tag_12 reverse")
-    parser.add_argument("--input_file",type=str,help="csv file with location of genbank files, start and stop genes and reverse/forward instructions")
+    parser.add_argument("--input", action='append', nargs=4,metavar=('genbank_file','start_gene','stop_gene',"reverse"),help="Genbank file and start and stop gene and if it should be plotted forward or reverse. Can be used multiple times to plot multiple gbk files and/or gene ranges below each other. Used -input 1.gbk locus_tag_1 locus_tag_6 forward -input 2.gbk locus_tag_8 locus_tag_12 reverse. Coordinates work as well: -input 1.gbk contig:10000-25000 - forward, or 5 kb on both sides of a gene: -input 1.gbk locus_tag_3 +5kb forward. Genbank files can be gzip, bgzip, bzip2 or xz compressed, - reads from stdin. GFF3 files can be used as well, for uncompressed and bgzip GFF3 files only the plotted regions are read, with an index, which is kept in --cache_dir if given")
+    parser.add_argument("--input_file",type=str,help="csv file with location of genbank files, start and stop genes and reverse/forward instructions. - reads it from stdin")
     parser.add_argument('--entry_type',  nargs='+', default=["CDS","rRNA","tRNA"],help="what should be printed? CDS? genes? Any valid genbank entries will do. Default: CDS rRNA tRNA")
     parser.add_argument("--output", help="If none is given, the output will be written to inputfile+startgene+stopgene.png. Please give the complete path otherwise, this script is not smart",
                     type=str,nargs='?')
@@ -556,34 +2849,96 @@ if __name__ == "__main__":
                     type=int,default=0,nargs='?')
     parser.add_argument("--color_file", help="A csv file can be given with locus or gene or gene product to hex color. Tab, comma and semicolon are valid separators. Partial lists can be given. Otherwise default color coding will take place",
                     type=str,nargs='?')
+    parser.add_argument("--rules_file", help="A csv file with the rules for the default colour coding, which replace the built-in ones: keyword and colour, the keyword is searched in the product (case insensitive), e.g. transpos;red. type=tRNA;#FF00FF colours by entry type. The first rule which fits wins. The --color_file still comes first",
+                    type=str,nargs='?')
     parser.add_argument("--name_file", help="A csv file can be given with locus or gene or gene product to a custom name. Tab, comma and semicolon are valid separators. Partial lists can be given. Otherwise the specified naming scheme will be used",
                     type=str,nargs='?')
     parser.add_argument("--label_offset", help="Specify if you want to have the labels higher or lower. Default 0. The height of the picture ranges from 0.1 to -0.1",
                     type=float,default=0,nargs='?')
+    parser.add_argument('--label_layout', help="fixed: all labels at the same height, as with --label_offset. auto: labels which would overlap are put into rows above each other (below with --label_location Down). Default fixed",choices=['fixed', 'auto'],
+                        default="fixed",nargs='?')
     parser.add_argument('--label_location', help="Should the label be above or below the genes?",choices=['Up', 'Down'],
                         default="Up",nargs='?')
     parser.add_argument('--label', help="What should be printed as label? gene_name will be in italics. This can be overriden with a csv file",choices=['gene_name','locus','product','locus+product','locus+gene_name','gene_name+product'],
                         default="gene_name",nargs='?')
     parser.add_argument("--arrow_thickness", help="Factor by which the arrow should be fattened. 1.5 means the arrow will be 50 percent thicker",
                     type=float,default=1,nargs='?')    
+    parser.add_argument("--overview", help="Plots which would be wider than this many pixels (at 50000 bp about 16000) are drawn at this width as overview: each entry as a block in its colour, to the right above and to the left below the line, or if there are too many entries for that, the number of entries per pixel as density. Without a number 4000. Default: always arrows",
+                    type=int,default=0,const=4000,nargs='?')
+    parser.add_argument("--pyramid", help="Directory into which tiles of the whole contig of each row are written instead of a plot, for browsing whole genomes: directory/contig/level/x.png. Level 0 is the whole contig in one tile, each level has twice as many tiles, up to the level where the tiles show arrows with labels. directory/contig/pyramid.json lists the levels. Rows are always forward. Tiles are rendered in --jobs processes",
+                    type=str,nargs='?')
+    parser.add_argument("--pyramid_tile_width", help="Width of the --pyramid tiles in pixels, they are a quarter as high. Default 1024",
+                    type=int,default=1024,nargs='?')
+    parser.add_argument("--pyramid_max_level", help="Last level of --pyramid, for not going all the way to arrows, which needs many tiles for big genomes. Default: up to the arrows",
+                    type=int,default=None,nargs='?')
+    parser.add_argument("--backend", help="matplotlib backend. It is set before matplotlib is loaded, so that it does not look for a display. Only non-interactive ones make sense. Default Agg",
+                    type=str,default="Agg",nargs='?')
+    parser.add_argument("--dpi", help="Pixels per inch of png and jpg plots, the size in inches is derived from the scale. Default: the matplotlib default, usually 100",
+                    type=float,default=None,nargs='?')
+    parser.add_argument("--max_width", help="Maximum width of png and jpg plots in pixels. Bigger plots get a lower dpi. Default: no maximum",
+                    type=int,default=0,nargs='?')
+    parser.add_argument("--max_height", help="Maximum height of png and jpg plots in pixels. Bigger plots get a lower dpi. Default: no maximum",
+                    type=int,default=0,nargs='?')
+    parser.add_argument("--png_compression", help="zlib compression level of png plots, 0 (none, fastest) to 9 (smallest). Default: the matplotlib default",
+                    type=int,choices=range(10),default=None,nargs='?',metavar="{0-9}")
+    parser.add_argument("--jpg_quality", help="Quality of jpg plots, 1 to 95. Default: the matplotlib default",
+                    type=int,default=None,nargs='?')
+    parser.add_argument("--optimize", help="Let the png/jpg encoder spend more time on making the file smaller",
+                        action='store_true')
+    parser.add_argument("--cache_dir", help="Directory in which parsed genbank files are stored. Re-plotting from the same genbank files will then not need to parse them again. The cache is updated automatically if a genbank file changes. Default: no cache",
+                    type=str,nargs='?')
     parser.add_argument('--deactivate_coordinates', help="Deactivate the display of genomic coordinates to the left and right of the first and last gene",action='store_false')
+    parser.add_argument("--batch", help="Manifest file for making many plots in one go. Each line holds the options for one plot, as they would be given on the command line, e.g. --input_file plot1.csv --output plot1 --font_size 36. Options which are not given in a line are taken from the command line. Lines starting with # will be ignored",
+                    type=str,nargs='?')
+    parser.add_argument("--processes", help="Number of processes used for --batch. Default 1",
+                    type=int,default=1,nargs='?')
+    parser.add_argument("--jobs", help="Number of processes used for reading the genbank files of a plot with several genbank files at the same time. Default 1",
+                    type=int,default=1,nargs='?')
+    parser.add_argument("--tiles", help="Plot each row as its own image, in --jobs processes, and put them together afterwards. Faster for plots with many rows. Works for png, jpg and svg, other formats are plotted at once. Labels which reach into the next row are cut",
+                        action='store_true')
+    parser.add_argument("--serve", help="Keep running as a local http server, which makes plots on request. POST the options as json to /plot, e.g. {\"input\":[[\"1.gbk\",\"locus_tag_1\",\"locus_tag_6\",\"forward\"]],\"font_size\":24}, the answer is the image. Parsed genbank files are kept between requests",
+                        action='store_true')
+    parser.add_argument("--host", help="Address for --serve. Default 127.0.0.1, only reachable from this computer",
+                    type=str,default="127.0.0.1",nargs='?')
+    parser.add_argument("--port", help="Port for --serve. Default 8765",
+                    type=int,default=8765,nargs='?')
+    parser.add_argument("--cache_features", help="Maximum number of features of all genbank files kept in memory by --serve and by each process of --batch, the ones which were used longest ago are dropped first. Default 5000000",
+                    type=int,default=5000000,nargs='?')
+    parser.add_argument("--force", help="Plot even if nothing changed. Otherwise a plot is skipped if the output exists and the options and the content of all input files (genbank, input, colour, rules and name files) are the same as last time, see output.last_input_hashes.txt",
+                        action='store_true')
+    parser.add_argument("--profile", help="Measure how long reading, finding the genes, plotting and saving take, per genbank file and in total, and the peak memory. Written as json (output.profile.json) together with cProfile statistics (output.profile.prof) next to the output",
+                        action='store_true')
+    parser.add_argument("--check_only","--check-only", help="Only check the input: read the genbank files and find the start and stop genes, but don't plot anything. A json report with contig and coordinates of each row and the scale is written to stdout, all other messages go to stderr. Exits with 1 if a row has a problem. With --batch, every job is checked, and the report has the report of each job",
+                        action='store_true')
     parser.add_argument('-v','--version', action='store_true')
+    return parser
+
+if __name__ == "__main__":
+    parser = get_parser()
     args = parser.parse_args()
 
+    outputReport = sys.stdout
+    if args.check_only:
+        sys.stdout = sys.stderr #only the json report should end up on stdout
     print ("version: "+VERSION)#I always want to have the version printed; like this it saves a line    
     if args.version:
         exit()
-    if args.input or args.input_file:
-        do_processing(args)
-    else:
-        print ("you need to provide input file and start/stop genes either via --input or --input_file")
-        parser.print_help()
+    try:
+        if args.batch:
+            if not run_batch(args,parser,outputReport):
+                exit(1)
+        elif args.serve:
+            serve(args)
+        elif args.check_only:
+            if not do_check(args,outputReport):
+                exit(1)
+        elif args.input or args.input_file:
+            do_processing(args)
+        else:
+            print ("you need to provide input file and start/stop genes either via --input or --input_file, or a --batch file")
+            parser.print_help()
+            exit(1)
+    except PlotError as e:
+        print (e)
+        print ("exiting")
         exit(1)
-
-    
-
-
-
-        
-
-